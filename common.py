@@ -12,3 +12,45 @@ DB_FILE_NAME = 'football_data.db'
 
 # DB
 DEFAULT_DB_TYPE = "postgresql"  # sqlite / postgresql
+DB_POOL_SIZE = 5  # per gunicorn worker
+DB_POOL_MAX_OVERFLOW = 10
+DB_POOL_TIMEOUT = 30  # seconds to wait for a free connection
+DB_POOL_RECYCLE = 1800
+DB_THREADS = 5  # blocking DB calls offloaded from the event loop, keep <= DB_POOL_SIZE
+
+# SportMonks
+INGEST_BATCH_ROWS = 2_000  # PlayerTeamSeason links per write while importing
+SPORTMONKS_WORKERS = 8
+SPORTMONKS_REQUESTS_PER_SECOND = 5
+SPORTMONKS_BURST = 10
+SPORTMONKS_CACHE_FILE = 'sportmonks_cache.db'
+SPORTMONKS_CACHE_TTL = {  # seconds by endpoint prefix, "" is the default; finished seasons never expire
+    "leagues/": 24 * 3600,
+    "teams/seasons/": 6 * 3600,
+    "squads/seasons/": 6 * 3600,
+    "players": 24 * 3600,
+    "": 3600,
+}
+
+# Admin player search
+PLAYER_SEARCH_LIMIT = 20
+
+# Similarity
+FEATURE_INDEX_DIR = 'feature_index'
+
+# Background jobs
+JOB_WORKERS = 2
+JOB_HEARTBEAT_SECONDS = 10
+JOB_STALE_SECONDS = 60  # a job not heartbeated for this long lost its worker
+
+# Cache
+CACHE_BACKEND = "sqlite"  # memory / sqlite (shared by all gunicorn workers)
+CACHE_FILE_NAME = 'cache.db'
+GAME_CACHE_MAX_ENTRIES = 1_000
+PLAYER_LIST_CACHE_MAX_ENTRIES = 16  # distinct league sets, each list is a few hundred KB
+RANK_CACHE_MAX_ENTRIES = 200_000
+RANK_CACHE_TTL_MINUTES = 60
+RANK_INDEX_MAX_GAMES = 64
+RANK_INDEX_MIN_LOOKUPS = 20  # rank misses of a game answered by point queries before its whole ranking is loaded
+CACHE_SWEEP_SECONDS = 60
+CACHE_POLL_SECONDS = 1  # how stale a worker's local cache tier may be after another worker drops an entry
@@ -0,0 +1,32 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncDBHandler:
+    """
+    Awaitable view of FootballDBHandler for the async endpoints.
+
+    Every handler method is exposed under the same name and runs on a bounded thread pool, so a slow query only ties
+    up one pool thread instead of the event loop. ``run`` offloads any other blocking call (cache misses, job
+    submission) to the same pool.
+    """
+
+    def __init__(self, db_handler, max_workers: int):
+        self.db = db_handler
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+        if not callable(method):
+            return method
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+
+        return call
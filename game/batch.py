@@ -0,0 +1,101 @@
+"""
+Batch game scheduling.
+
+Ranks many games at once over a process pool. Every worker memory-maps the same read-only feature index
+snapshot, then all games are inserted in one transaction with a single renumbering pass.
+
+    python -m game.batch games.csv --processes 4
+
+The CSV needs player_id, leagues (e.g. "8;82"), activate_at ("%Y-%m-%d %H:%M:%S") and an optional hint column.
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from game.similarity import PlayerFeatures, rank_players
+
+# Worker state, set by _init_worker
+_features = None
+_league_sets = {}
+
+
+def _init_worker(index_path):
+    global _features
+    _features = PlayerFeatures.load(index_path)
+
+
+def _rank(player_id, leagues):
+    key = tuple(sorted({int(league_id) for league_id in leagues}))
+    features = _league_sets.get(key)
+    if features is None:
+        features = _league_sets[key] = _features.for_leagues(key)
+
+    return rank_players(features, player_id)
+
+
+def _rank_game(game):
+    return _rank(game["player_id"], game["leagues"])
+
+
+def rank_games(feature_index, games, processes=None):
+    """Distances for every game, in order. ``games`` are dicts with player_id and leagues."""
+    index_path = feature_index.current_path()
+    processes = min(processes or os.cpu_count() or 1, len(games))
+
+    if processes <= 1:
+        return [rank_players(feature_index.load(game["leagues"]), game["player_id"]) for game in games]
+
+    # Spawned workers don't inherit the web worker's threads or database connections
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(index_path,)) as executor:
+        return list(executor.map(_rank_game, games, chunksize=max(1, len(games) // (processes * 4))))
+
+
+def schedule_games(db_handler, feature_index, player_catalogue, games, processes=None):
+    """
+    Rank and insert ``games`` (dicts with player_id, leagues, activate_at and hint).
+    Returns the (old, new) game numbers that moved.
+    """
+    if not games:
+        return []
+
+    distances = rank_games(feature_index, games, processes)
+    return db_handler.create_games([
+        {"activate_at": game["activate_at"], "distance": distance, "hint": game.get("hint"), "leagues": game["leagues"],
+         "players": player_catalogue.get(game["leagues"])}
+        for game, distance in zip(games, distances)
+    ])
+
+
+def read_games_csv(path):
+    from utils import parse_datetime
+
+    with open(path, newline="", encoding="utf-8") as f:
+        return [
+            {
+                "player_id": int(row["player_id"]),
+                "leagues": [int(league_id) for league_id in row["leagues"].split(";") if league_id],
+                "activate_at": parse_datetime(row["activate_at"]),
+                "hint": row.get("hint") or None,
+            }
+            for row in csv.DictReader(f)
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schedule a batch of games from a CSV file")
+    parser.add_argument("path", help="CSV with player_id, leagues, activate_at and hint columns")
+    parser.add_argument("--processes", type=int, default=None, help="Ranking processes (default: CPU count)")
+    args = parser.parse_args()
+
+    from game.config import db_service, feature_index, player_catalogue
+
+    games = read_games_csv(args.path)
+    moves = schedule_games(db_service, feature_index, player_catalogue, games, args.processes)
+    print(f"Created {len(games)} games, renumbered {len(moves)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,480 @@
+import gzip
+import hashlib
+import heapq
+import json
+import pickle
+import sqlite3
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from itertools import count
 from datetime import datetime, timedelta
-from typing import Any, Optional
+from typing import Any, Hashable, Optional
+
+from common import RANK_CACHE_MAX_ENTRIES, RANK_CACHE_TTL_MINUTES, RANK_INDEX_MAX_GAMES, GAME_CACHE_MAX_ENTRIES, \
+    CACHE_SWEEP_SECONDS, CACHE_BACKEND, CACHE_FILE_NAME, PLAYER_LIST_CACHE_MAX_ENTRIES, CACHE_POLL_SECONDS, \
+    RANK_INDEX_MIN_LOOKUPS
+
+MISSING = object()
+
+
+def _plain(value):
+    # Numpy scalars (from pandas rows) aren't JSON serialisable
+    return value.item() if hasattr(value, "item") else value
+
+
+class GameResponse:
+    """
+    Final /api/game body, serialised once when the cache is filled, with its ETag and a gzip variant.
+
+    The gzip variant is another representation of the resource, so it has its own strong ETag.
+    """
+
+    GZIP_MIN_SIZE = 1024
+
+    def __init__(self, game, players: str):
+        self.game_id = _plain(game["id"])
+        self.game_number = _plain(game["game_number"])
+
+        # ``players`` is the JSON list as stored in PlayerLists, spliced in without a parse / encode round trip
+        self.body = (
+            '{"max_rank":%s,"hint":%s,"players":%s,"game_number":%s,"max_game_number":%s}' % (
+                json.dumps(_plain(game["max_rank"])), json.dumps(game["hint"], ensure_ascii=False), players,
+                json.dumps(self.game_number), json.dumps(_plain(game["max_game_number"])))
+        ).encode("utf-8")
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()}"'
+        self.gzip_body = gzip.compress(self.body, compresslevel=6) if len(self.body) >= self.GZIP_MIN_SIZE else None
+        self.gzip_etag = f'"{self.etag[1:-1]}-gz"' if self.gzip_body else None
+
+
+class LRUCache:
+    """
+    Bounded LRU cache with per-entry expiry.
+
+    Entries can be tagged (e.g. with their game number) so a whole tag is dropped without scanning the cache.
+    Expired entries are evicted when read and by a sweep that runs at most every ``sweep_interval``; the sweep pops
+    an expiry heap up to the first live entry instead of walking the whole cache.
+    """
+
+    def __init__(self, max_entries: int, ttl: timedelta, sweep_interval: timedelta = timedelta(seconds=CACHE_SWEEP_SECONDS)):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+
+        self.entries: OrderedDict[Hashable, tuple[Any, datetime, Hashable]] = OrderedDict()
+        self.tags: dict[Hashable, set] = {}
+        self._expiry: list[tuple[datetime, int, Hashable]] = []
+        self._sequence = count()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+        self._next_sweep = datetime.now() + sweep_interval
+        # Admin jobs revoke entries from other threads
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default=MISSING):
+        now = datetime.now()
+        with self._lock:
+            self._maybe_sweep(now)
+
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires, _ = entry
+            if now >= expires:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_local(self, key: Hashable, default=MISSING):
+        """``get``, which never does I/O here: safe to call from the event loop."""
+        return self.get(key, default)
+
+    def set(self, key: Hashable, value, tag: Hashable = None, ttl: Optional[timedelta] = None):
+        now = datetime.now()
+        with self._lock:
+            self._maybe_sweep(now)
+
+            if key in self.entries:
+                self._remove(key)
+            expires = now + (ttl or self.ttl)
+            self.entries[key] = (value, expires, tag)
+            heapq.heappush(self._expiry, (expires, next(self._sequence), key))
+            if tag is not None:
+                self.tags.setdefault(tag, set()).add(key)
+
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            if key in self.entries:
+                self._remove(key)
+
+    def pop_tag(self, tag: Hashable):
+        with self._lock:
+            for key in self.tags.pop(tag, ()):
+                self.entries.pop(key, None)
+
+    def poll_invalidations(self) -> list:
+        """Tags dropped by other processes since the last call; a process-local cache never has any."""
+        return []
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.tags.clear()
+            self._expiry.clear()
+
+    def sweep(self):
+        with self._lock:
+            self._sweep(datetime.now())
+
+    def stats(self) -> dict[str, int]:
+        return {"entries": len(self.entries), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "expirations": self.expirations}
+
+    def _maybe_sweep(self, now: datetime):
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+    def _sweep(self, now: datetime):
+        while self._expiry and now >= self._expiry[0][0]:
+            expires, _, key = heapq.heappop(self._expiry)
+            # Skip queue items of entries that were replaced, evicted or revoked since
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] == expires:
+                self._remove(key)
+                self.expirations += 1
+
+        # Replaced / evicted keys leave stale queue items behind, compact when they dominate
+        if len(self._expiry) > 2 * max(len(self.entries), self.max_entries):
+            self._expiry = [(expires, next(self._sequence), key) for key, (_, expires, _) in self.entries.items()]
+            heapq.heapify(self._expiry)
+
+        self._next_sweep = now + self.sweep_interval
+
+    def _remove(self, key: Hashable):
+        _, _, tag = self.entries.pop(key)
+        if tag is not None:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+
+class RankIndex:
+    """
+    Player id -> rank lookup for a single game, kept as sorted id / rank arrays and searched with bisect.
+    """
+
+    def __init__(self, ranking):
+        pairs = sorted((int(item["id"]), int(item["rank"])) for item in ranking)
+        self.ids = array("q", [player_id for player_id, _ in pairs])
+        self.ranks = array("l", [rank for _, rank in pairs])
+
+    def get(self, player_id: int) -> Optional[int]:
+        index = bisect_left(self.ids, player_id)
+        if index < len(self.ids) and self.ids[index] == player_id:
+            return self.ranks[index]
+
+        return None
+
+
+class SQLiteCache:
+    """
+    Cache shared by every worker process through one SQLite file, with the same interface as ``LRUCache``.
+
+    Several caches live in the file side by side, one per ``namespace``. Values are pickled. Eviction is
+    approximately LRU: the access time is refreshed at most once per ``touch_interval``. Dropping a key or a tag and
+    clearing are also logged, so each process can drop what it keeps locally from those entries (see
+    ``poll_events``).
+    """
+
+    EVICT_EVERY = 100
+
+    def __init__(self, path: str, namespace: str, max_entries: int, ttl: timedelta,
+                 sweep_interval: timedelta = timedelta(seconds=CACHE_SWEEP_SECONDS),
+                 touch_interval: timedelta = timedelta(minutes=1)):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.touch_interval = touch_interval.total_seconds()
+        self.hits = self.misses = 0
+
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS CacheEntries (
+                namespace TEXT NOT NULL,
+                key       TEXT NOT NULL,
+                tag       TEXT,
+                value     BLOB,
+                expires   REAL NOT NULL,
+                accessed  REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_cache_entries_tag ON CacheEntries (namespace, tag);
+            CREATE INDEX IF NOT EXISTS idx_cache_entries_accessed ON CacheEntries (namespace, accessed);
+
+            CREATE TABLE IF NOT EXISTS CacheInvalidations (
+                id        INTEGER PRIMARY KEY AUTOINCREMENT,
+                namespace TEXT NOT NULL,
+                tag       TEXT NOT NULL,
+                created   REAL NOT NULL,
+                kind      TEXT NOT NULL DEFAULT 'tag'
+            );
+        ''')
+        try:
+            # Cache files from before key and clear events were logged
+            self.conn.execute("ALTER TABLE CacheInvalidations ADD COLUMN kind TEXT NOT NULL DEFAULT 'tag'")
+        except sqlite3.OperationalError:
+            pass
+
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._next_sweep = time.time() + sweep_interval.total_seconds()
+        self._last_invalidation = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM CacheInvalidations").fetchone()[0]
+
+    def get(self, key: Hashable, default=MISSING):
+        now = time.time()
+        with self._lock:
+            self._maybe_sweep(now)
+
+            row = self.conn.execute("SELECT value, expires, accessed FROM CacheEntries WHERE namespace = ? AND key = ?",
+                                    (self.namespace, json.dumps(key))).fetchone()
+            if row is None or now >= row[1]:
+                self.misses += 1
+                return default
+
+            if now - row[2] > self.touch_interval:
+                self.conn.execute("UPDATE CacheEntries SET accessed = ? WHERE namespace = ? AND key = ?",
+                                  (now, self.namespace, json.dumps(key)))
+
+            self.hits += 1
+            return pickle.loads(row[0])
+
+    def set(self, key: Hashable, value, tag: Hashable = None, ttl: Optional[timedelta] = None):
+        now = time.time()
+        with self._lock:
+            self._maybe_sweep(now)
+
+            self.conn.execute("INSERT OR REPLACE INTO CacheEntries (namespace, key, tag, value, expires, accessed) "
+                              "VALUES (?, ?, ?, ?, ?, ?)",
+                              (self.namespace, json.dumps(key), None if tag is None else json.dumps(tag),
+                               pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL),
+                               now + (ttl or self.ttl).total_seconds(), now))
+
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict()
+
+    def get_entry(self, key: Hashable):
+        """(value, tag, expires) of a live entry, or None. Doesn't count as a hit or refresh the access time."""
+        row = self.conn.execute("SELECT value, tag, expires FROM CacheEntries WHERE namespace = ? AND key = ?",
+                                (self.namespace, json.dumps(key))).fetchone()
+        if row is None or time.time() >= row[2]:
+            return None
+
+        return pickle.loads(row[0]), None if row[1] is None else json.loads(row[1]), row[2]
+
+    def pop(self, key: Hashable):
+        self._invalidate("key", key, "DELETE FROM CacheEntries WHERE namespace = ? AND key = ?",
+                         (self.namespace, json.dumps(key)))
+
+    def pop_tag(self, tag: Hashable):
+        self._invalidate("tag", tag, "DELETE FROM CacheEntries WHERE namespace = ? AND tag = ?",
+                         (self.namespace, json.dumps(tag)))
+
+    def _invalidate(self, kind: str, value, statement: str, params):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.execute(statement, params)
+            self.conn.execute("INSERT INTO CacheInvalidations (namespace, kind, tag, created) VALUES (?, ?, ?, ?)",
+                              (self.namespace, kind, json.dumps(value), time.time()))
+            self.conn.execute("COMMIT")
+
+    def poll_events(self) -> list:
+        """(kind, value) of the keys ("key"), tags ("tag") and clears ("clear") dropped by any process since the last
+        call."""
+        with self._lock:
+            rows = self.conn.execute("SELECT id, kind, tag FROM CacheInvalidations WHERE id > ? AND namespace = ? "
+                                     "ORDER BY id", (self._last_invalidation, self.namespace)).fetchall()
+            if rows:
+                self._last_invalidation = rows[-1][0]
+
+            return [(kind, json.loads(value)) for _, kind, value in rows]
+
+    def poll_invalidations(self) -> list:
+        """Tags dropped (by any process) since the last call."""
+        return [value for kind, value in self.poll_events() if kind == "tag"]
+
+    def clear(self):
+        self._invalidate("clear", None, "DELETE FROM CacheEntries WHERE namespace = ?", (self.namespace,))
+
+    def sweep(self):
+        with self._lock:
+            self._sweep(time.time())
+
+    def stats(self) -> dict[str, int]:
+        entries = self.conn.execute("SELECT COUNT(*) FROM CacheEntries WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+        return {"entries": entries, "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+    def _maybe_sweep(self, now: float):
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+    def _sweep(self, now: float):
+        self.conn.execute("DELETE FROM CacheEntries WHERE namespace = ? AND expires <= ?", (self.namespace, now))
+        self.conn.execute("DELETE FROM CacheInvalidations WHERE created <= ?", (now - 86400,))
+        self._next_sweep = now + self.sweep_interval.total_seconds()
+
+    def _evict(self):
+        self.conn.execute("""
+            DELETE FROM CacheEntries WHERE namespace = ? AND key IN (
+                SELECT key FROM CacheEntries WHERE namespace = ? ORDER BY accessed DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.namespace, self.namespace, self.max_entries))
+
+
+class TieredCache:
+    """
+    A process-local ``LRUCache`` in front of a ``SQLiteCache`` shared by all workers, with the same interface.
+
+    Reads are served locally and fall back to the shared file, whose entries are then kept locally for what is left
+    of their TTL. Writes go to both tiers, unless ``share_values`` is off: then values stay local (for values cheaper
+    to recompute than to write to the file) and only drops go through the shared file. Drops by any process are read
+    from the shared invalidation log at most every ``poll_interval``, so another worker's revocation reaches this
+    process's local tier within that delay.
+    """
+
+    def __init__(self, local: LRUCache, shared: SQLiteCache, share_values: bool = True,
+                 poll_interval: timedelta = timedelta(seconds=CACHE_POLL_SECONDS)):
+        self.local = local
+        self.shared = shared
+        self.share_values = share_values
+        self.poll_interval = poll_interval.total_seconds()
+
+        self._next_poll = 0.0
+        self._tags = []
+        self._lock = threading.Lock()
+
+    def _sync(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now < self._next_poll:
+            return
+
+        with self._lock:
+            self._next_poll = now + self.poll_interval
+            for kind, value in self.shared.poll_events():
+                if kind == "key":
+                    self.local.pop(value if isinstance(value, str) else tuple(value))
+                elif kind == "tag":
+                    self.local.pop_tag(value)
+                    self._tags.append(value)
+                else:
+                    self.local.clear()
+
+    def get(self, key: Hashable, default=MISSING):
+        self._sync()
+        value = self.local.get(key, MISSING)
+        if value is not MISSING or not self.share_values:
+            return default if value is MISSING else value
+
+        entry = self.shared.get_entry(key)
+        if entry is None:
+            return default
+
+        value, tag, expires = entry
+        self.local.set(key, value, tag=tag, ttl=timedelta(seconds=expires - time.time()))
+        return value
+
+    def get_local(self, key: Hashable, default=MISSING):
+        """
+        The value held in this process, without reading the shared file: safe to call from the event loop. Misses
+        once the invalidation log is due for a poll, so the caller goes through ``get``, which polls it.
+        """
+        if time.monotonic() >= self._next_poll:
+            return default
+
+        return self.local.get(key, default)
+
+    def set(self, key: Hashable, value, tag: Hashable = None, ttl: Optional[timedelta] = None):
+        self.local.set(key, value, tag=tag, ttl=ttl)
+        if self.share_values:
+            self.shared.set(key, value, tag=tag, ttl=ttl)
+
+    def pop(self, key: Hashable):
+        self.local.pop(key)
+        self.shared.pop(key)
+
+    def pop_tag(self, tag: Hashable):
+        self.local.pop_tag(tag)
+        self.shared.pop_tag(tag)
+
+    def poll_invalidations(self) -> list:
+        """Tags dropped (by any process) since the last call."""
+        self._sync(force=True)
+        with self._lock:
+            tags, self._tags = self._tags, []
+            return tags
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def sweep(self):
+        self.local.sweep()
+        self.shared.sweep()
+
+    def stats(self) -> dict:
+        return {"local": self.local.stats(), "shared": self.shared.stats()}
+
+
+def create_cache(namespace: str, max_entries: int, ttl: timedelta, backend: str = CACHE_BACKEND,
+                 share_values: bool = True):
+    """
+    A process-local ``LRUCache``, or for the "sqlite" backend a ``TieredCache`` backed by a file shared by all workers.
+    """
+    if backend == "sqlite":
+        return TieredCache(LRUCache(max_entries, ttl), SQLiteCache(CACHE_FILE_NAME, namespace, max_entries, ttl),
+                           share_values)
+    elif backend == "memory":
+        return LRUCache(max_entries, ttl)
+
+    raise ValueError("Unsupported cache backend")
 
 
 class GameCacheService:
-    def __init__(self, db_handler):
+    def __init__(self, db_handler, backend: str = CACHE_BACKEND, rank_cache_max_entries: int = RANK_CACHE_MAX_ENTRIES,
+                 rank_index_max_games: int = RANK_INDEX_MAX_GAMES,
+                 rank_index_min_lookups: int = RANK_INDEX_MIN_LOOKUPS):
         self.db = db_handler
-        self.by_id_cache: dict[int, dict[str, Any]] = {}
-        self.latest_cache: dict[str, Any] = {"expires": datetime.min, "data": None}
-        self.rank_cache: dict[tuple[int, int], dict[str, Any]] = {}
+        # ("game", game_number) and ("latest",) -> GameResponse
+        self.game_cache = create_cache("games", GAME_CACHE_MAX_ENTRIES, timedelta(days=1), backend)
+        # (game_number, player_id) -> rank, tagged by game number. Ranks are cheaper to recompute from the rank index than
+        # to read from the file, so only their invalidations are shared
+        self.rank_cache = create_cache("ranks", rank_cache_max_entries, timedelta(minutes=RANK_CACHE_TTL_MINUTES), backend,
+                                       share_values=False)
+        # game_number -> RankIndex, always process-local; revocations from other workers arrive via the rank cache
+        self.rank_indexes = LRUCache(rank_index_max_games, timedelta(days=1))
+        # game_number -> rank misses so far; a game's first rank_index_min_lookups misses use point queries
+        self.rank_index_min_lookups = rank_index_min_lookups
+        self.rank_lookups = LRUCache(rank_index_max_games * 4, timedelta(days=1))
+        # PlayerLists hash -> JSON player list, process-local, content addressed so never stale
+        self.player_lists = LRUCache(PLAYER_LIST_CACHE_MAX_ENTRIES, timedelta(days=1))
 
     def _next_interval(self, now: datetime) -> datetime:
         minutes_to_next = 5 - (now.minute % 5)
@@ -15,71 +482,140 @@ class GameCacheService:
             minutes_to_next = 5
         return now + timedelta(minutes=minutes_to_next, seconds=-now.second, microseconds=-now.microsecond)
 
-    def get_game_by_row_number(self, game_number: Optional[int] = None):
+    def get_game_response(self, game_number: Optional[int] = None) -> Optional[GameResponse]:
         now = datetime.now()
 
         if game_number is not None:
-            entry = self.by_id_cache.get(game_number)
-            if entry and now < entry["expires"]:
+            result = self.game_cache.get(("game", game_number), None)
+            if result is not None:
                 print('CACHED ANSWER! (game)')
 
-                return entry["data"]
-            result = self.db.get_customer_game(game_number)
-            if result:
-                self.by_id_cache[game_number] = {
-                    "data": result,
-                    "expires": now + timedelta(days=1)
-                }
+                return result
+            game = self.db.get_customer_game(game_number)
+            if game:
+                result = GameResponse(game, self.get_player_list(game["players_hash"]))
+                self.game_cache.set(("game", game_number), result)
                 print('NOT CACHE (game)')
                 return result
 
-        if now < self.latest_cache["expires"] and self.latest_cache["data"] is not None:
+        result = self.game_cache.get(("latest",), None)
+        if result is not None:
             print('CACHED ANSWER!')
-            return self.latest_cache["data"]
+            return result
+
+        game = self.db.get_customer_game(None)
+        if not game:
+            return None
 
-        result = self.db.get_customer_game(None)
-        self.latest_cache["data"] = result
-        self.latest_cache["expires"] = self._next_interval(now)
+        result = GameResponse(game, self.get_player_list(game["players_hash"]))
+        self.game_cache.set(("latest",), result, ttl=self._next_interval(now) - now)
         print('NOT CACHE')
         return result
 
+    def peek_game_response(self, game_number: Optional[int] = None) -> Optional[GameResponse]:
+        """
+        ``get_game_response`` when the answer is cached in this process, else None (then call that one off the event
+        loop). Never blocks on the database or the cache file.
+        """
+        result = self.game_cache.get_local(("game", game_number) if game_number is not None else ("latest",), None)
+        if result is not None:
+            print('CACHED ANSWER! (game)' if game_number is not None else 'CACHED ANSWER!')
+
+        return result
+
+    def get_player_list(self, players_hash: Optional[str]) -> str:
+        if players_hash is None:
+            return "[]"
+
+        players = self.player_lists.get(players_hash, None)
+        if players is None:
+            players = self.db.get_player_list(players_hash) or "[]"
+            self.player_lists.set(players_hash, players)
+
+        return players
+
     def revoke_game(self, game_id: int):
-        self.by_id_cache.pop(game_id, None)
+        self.game_cache.pop(("game", game_id))
+
+    def revoke_moved_games(self, moves):
+        """Drop what's cached under the game numbers of renumbered games, (old, new) pairs."""
+        for game_number in {number for move in moves for number in move if number is not None}:
+            self.revoke_game(game_id=game_number)
+            self.revoke_ranks_for_game(game_id=game_number)
 
     def clear_game_cache(self):
-        self.by_id_cache.clear()
-        self.latest_cache = {"expires": datetime.min, "data": None}
+        self.game_cache.clear()
+
+    def peek_rank(self, game_number: int, player_id: int):
+        """``get_rank`` when the rank is cached in this process, else MISSING. Never blocks on I/O."""
+        return self.rank_cache.get_local((game_number, player_id))
 
     def get_rank(self, game_number: int, player_id: int):
-        now = datetime.now()
         key = (game_number, player_id)
-        entry = self.rank_cache.get(key)
+        rank = self.rank_cache.get(key)
+        if rank is not MISSING:
+            return rank
+
+        rank_index = self.get_rank_index(game_number, load=False)
+        if rank_index is None and self._count_rank_lookup(game_number) <= self.rank_index_min_lookups:
+            # Cold game (archived, or just activated): an indexed point query instead of loading the whole ranking.
+            # None is also what a game that isn't active yet answers, so it isn't cached
+            rank = self.db.get_player_rank(game_number, player_id)
+            if rank is not None:
+                self.rank_cache.set(key, rank, tag=game_number)
+            return rank
 
-        if entry and now < entry["expires"]:
-            return entry["data"]
+        rank_index = rank_index or self.get_rank_index(game_number)
+        if rank_index is None:
+            return None
 
-        rank = self.db.get_player_rank(game_number, player_id)
-        self.rank_cache[key] = {
-            "data": rank,
-            "expires": now + timedelta(hours=1)
-        }
+        rank = rank_index.get(player_id)
+        self.rank_cache.set(key, rank, tag=game_number)
 
         return rank
 
+    def _count_rank_lookup(self, game_number: int) -> int:
+        lookups = self.rank_lookups.get(game_number, 0) + 1
+        self.rank_lookups.set(game_number, lookups)
+
+        return lookups
+
+    def get_rank_index(self, game_number: int, load: bool = True) -> Optional[RankIndex]:
+        # Games revoked by another worker
+        for revoked_game_number in self.rank_cache.poll_invalidations():
+            self.rank_indexes.pop(revoked_game_number)
+
+        rank_index = self.rank_indexes.get(game_number, None)
+        if rank_index is None and load:
+            # Loaded once per game, games that aren't active yet aren't kept
+            ranking = self.db.get_game_ranking(game_number)
+            if ranking is None:
+                return None
+
+            rank_index = RankIndex(ranking)
+            self.rank_indexes.set(game_number, rank_index)
+
+        return rank_index
+
     def revoke_rank(self, game_id: int, player_id: int):
-        self.rank_cache.pop((game_id, player_id), None)
+        self.rank_cache.pop((game_id, player_id))
 
     def revoke_ranks_for_game(self, game_id: int):
-        keys_to_remove = [key for key in self.rank_cache if key[0] == game_id]
-        for key in keys_to_remove:
-            self.rank_cache.pop(key, None)
+        self.rank_cache.pop_tag(game_id)
+        self.rank_indexes.pop(game_id)
 
         self.revoke_latest_game(game_id)
 
     def revoke_latest_game(self, game_id: int):
-        cached = self.latest_cache.get("data")
-        if cached and isinstance(cached, dict) and cached.get("id") == game_id:
-            self.latest_cache = {"expires": datetime.min, "data": None}
+        cached = self.game_cache.get(("latest",), None)
+        if cached is not None and cached.game_number == game_id:
+            self.game_cache.pop(("latest",))
 
     def clear_rank_cache(self):
         self.rank_cache.clear()
+        self.rank_indexes.clear()
+        self.rank_lookups.clear()
+
+    def stats(self):
+        return {"game_cache": self.game_cache.stats(), "rank_cache": self.rank_cache.stats(),
+                "rank_indexes": self.rank_indexes.stats(), "player_lists": self.player_lists.stats()}
@@ -0,0 +1,55 @@
+import json
+import threading
+
+
+class PlayerCatalogue:
+    """
+    Autocomplete player lists ({"id", "name"}) per league set, serialised to JSON once and shared by game creations
+    and /players-by-leagues.
+
+    Catalogues are keyed by the sorted league ids and tagged with the "roster" and "player_names" data versions.
+    Ingestion bumps the former and Hebrew name edits the latter, so a changed version rebuilds the catalogues
+    lazily, one league set at a time.
+    """
+
+    VERSION_NAMES = ("roster", "player_names")
+    MAX_LEAGUE_SETS = 32
+
+    def __init__(self, db_handler):
+        self.db = db_handler
+        self._lock = threading.Lock()
+        self._version = None
+        self._league_sets = {}
+        self.hits = self.misses = 0
+
+    @staticmethod
+    def key(leagues_id) -> tuple:
+        return tuple(sorted({int(league_id) for league_id in leagues_id or ()}))
+
+    def get(self, leagues_id) -> str:
+        """JSON array of the players of ``leagues_id`` (every player when empty)."""
+        versions = self.db.get_data_versions()
+        version = tuple(versions.get(name, 0) for name in self.VERSION_NAMES)
+        key = self.key(leagues_id)
+
+        with self._lock:
+            if self._version != version:
+                self._version = version
+                self._league_sets = {}
+
+            players = self._league_sets.get(key)
+            if players is not None:
+                self.hits += 1
+                return players
+
+            self.misses += 1
+            players = json.dumps(self.db.get_autocomplete_players(list(key)), ensure_ascii=False)
+            if len(self._league_sets) >= self.MAX_LEAGUE_SETS:
+                self._league_sets.pop(next(iter(self._league_sets)))
+            self._league_sets[key] = players
+
+            return players
+
+    def stats(self):
+        return {"league_sets": len(self._league_sets), "version": self._version, "hits": self.hits,
+                "misses": self.misses}
@@ -1,10 +1,19 @@
-from common import USERNAME, PASSWORD, JWT_EXPIRE_MINUTES, JWT_ALGORITHM, JWT_SECRET
+from common import USERNAME, PASSWORD, JWT_EXPIRE_MINUTES, JWT_ALGORITHM, JWT_SECRET, FEATURE_INDEX_DIR, JOB_WORKERS, \
+    DB_THREADS
+from game.aio import AsyncDBHandler
 from game.cache import GameCacheService
+from game.catalogue import PlayerCatalogue
 from game.db import FootballDBHandler
+from game.feature_index import FeatureIndex
+from game.jobs import JobQueue
 from game.auth import JWTAuth
 
 
 db_service = FootballDBHandler()
+async_db = AsyncDBHandler(db_service, DB_THREADS)
 game_service = GameCacheService(db_service)
+feature_index = FeatureIndex(db_service, FEATURE_INDEX_DIR)
+player_catalogue = PlayerCatalogue(db_service)
+job_queue = JobQueue(db_service, JOB_WORKERS)
 auth = JWTAuth(secret_key=JWT_SECRET, algorithm=JWT_ALGORITHM, expires_minutes=JWT_EXPIRE_MINUTES,
                username=USERNAME, password=PASSWORD)
@@ -1,18 +1,24 @@
+import csv
+import hashlib
+import io
 import os
 import json
 import sqlite3
-import pandas as pd
+import threading
+import time
 import atexit
 
+from contextlib import closing, contextmanager
 from datetime import datetime
 from typing import Optional
 
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 
-from common import DB_FILE_NAME, DEFAULT_DB_TYPE
-from sqlalchemy import create_engine
+from common import DB_FILE_NAME, DEFAULT_DB_TYPE, DB_POOL_SIZE, DB_POOL_MAX_OVERFLOW, DB_POOL_TIMEOUT, \
+    DB_POOL_RECYCLE, INGEST_BATCH_ROWS, PLAYER_SEARCH_LIMIT
+from sqlalchemy import create_engine, event
 
-from psycopg2.extras import execute_batch
+from psycopg2.extras import execute_batch, execute_values
 import psycopg2
 
 
@@ -20,7 +26,19 @@ class FootballDBHandler:
     _instance = None
     _initialized = False
 
-    def __new__(cls):
+    SEARCH_COLUMNS = ("display_name_he", "first_name_he", "last_name_he", "display_name", "first_name", "last_name")
+    # Every searchable name in one string, the expression the PostgreSQL trigram index is built on
+    SEARCH_DOCUMENT = " || ' ' || ".join(f"COALESCE({column}, '')" for column in SEARCH_COLUMNS)
+
+    # Secondary indexes of the hot read paths, append only: the "schema_indexes" data version counts those created
+    INDEXES = (
+        "CREATE INDEX IF NOT EXISTS ix_games_activate_at ON Games (activate_at)",
+        "CREATE INDEX IF NOT EXISTS ix_games_game_number ON Games (game_number, activate_at)",
+        "CREATE INDEX IF NOT EXISTS ix_pts_season_player ON PlayerTeamSeason (season_id, player_id)",
+        "CREATE INDEX IF NOT EXISTS ix_seasons_league ON Seasons (league_id)",
+    )
+
+    def __new__(cls, *args, **kwargs):
         # Singleton: only one instance
         if cls._instance is None:
             cls._instance = super(FootballDBHandler, cls).__new__(cls)
@@ -32,9 +50,15 @@ class FootballDBHandler:
             return
 
         self.param_key = None
-        self.conn = None
         self.engine = None
 
+        # Connection checked out by the current thread, see connection()
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._checkouts = 0
+        self._checkout_wait = 0.0
+        self._checkout_wait_max = 0.0
+
         self.db_type = db_type
         self.init_db_type()
 
@@ -48,17 +72,70 @@ class FootballDBHandler:
 
     def init_db_type(self):
         if self.db_type == "sqlite":
-            self.conn = sqlite3.connect(DB_FILE_NAME)
-            self.conn.execute("PRAGMA foreign_keys = ON")
-            self.conn.execute("PRAGMA journal_mode = WAL")
+            # Pooled connections are handed between request and job threads
+            self.engine = create_engine(f"sqlite:///{DB_FILE_NAME}", connect_args={"check_same_thread": False},
+                                        **self.__pool_options())
+
+            @event.listens_for(self.engine, "connect")
+            def _set_pragmas(dbapi_conn, connection_record):
+                dbapi_conn.execute("PRAGMA foreign_keys = ON")
+                dbapi_conn.execute("PRAGMA journal_mode = WAL")
+
             self.param_key = '?'
         elif self.db_type == "postgresql":
             self.engine = self.create_db()
-            self.conn = self.engine.raw_connection()
             self.param_key = '%s'
         else:
             raise ValueError("Unsupported database type")
 
+    @staticmethod
+    def __pool_options():
+        return {"pool_size": DB_POOL_SIZE, "max_overflow": DB_POOL_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT,
+                "pool_recycle": DB_POOL_RECYCLE, "pool_pre_ping": True}
+
+    @contextmanager
+    def connection(self):
+        """
+        Check a DBAPI connection out of the pool for the duration of the block and return it afterwards, rolling back
+        anything left uncommitted. Nested blocks on the same thread reuse the outer connection, so a method calling
+        another one runs on a single connection.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+
+        started = time.perf_counter()
+        pooled = self.engine.raw_connection()
+        self.__record_checkout(time.perf_counter() - started)
+
+        self._local.conn = pooled.driver_connection
+        try:
+            yield self._local.conn
+        finally:
+            self._local.conn = None
+            # Returns the connection to the pool, the pool resets it with a rollback
+            pooled.close()
+
+    def __record_checkout(self, wait: float):
+        with self._stats_lock:
+            self._checkouts += 1
+            self._checkout_wait += wait
+            self._checkout_wait_max = max(self._checkout_wait_max, wait)
+
+    def pool_stats(self):
+        pool = self.engine.pool
+        with self._stats_lock:
+            return {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "checkouts": self._checkouts,
+                "avg_wait_ms": round(1000 * self._checkout_wait / self._checkouts, 3) if self._checkouts else 0.0,
+                "max_wait_ms": round(1000 * self._checkout_wait_max, 3),
+            }
+
     def create_db(self):
         if self.db_type == "postgresql":
             def _create_database():
@@ -114,7 +191,7 @@ class FootballDBHandler:
                             _load_data_from_sql_file(sql_file_path)
 
                 # Create the engine with the correct database name
-                return create_engine(db_url)
+                return create_engine(db_url, **self.__pool_options())
 
             # Data
             db_url = os.getenv("DATABASE_URL")
@@ -131,335 +208,964 @@ class FootballDBHandler:
             return _setup_postgres_db("raw_db.sql")
 
     def create_tables(self):
-        cursor = self.conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+
+            if self.db_type == "sqlite":
+                # Countries
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS Countries (
+                        id INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        image TEXT
+                    );
+                ''')
+
+                # Leagues
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS Leagues (
+                        id INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        image TEXT,
+                        sub_type TEXT
+                    );
+                ''')
+
+                # Seasons
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS Seasons (
+                        id INTEGER PRIMARY KEY,
+                        league_id INTEGER NOT NULL,
+                        name TEXT NOT NULL,
+                        FOREIGN KEY (league_id) REFERENCES Leagues(id)
+                    );
+                ''')
+
+                # Teams
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS Teams (
+                        id INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        image TEXT,
+                        country_id INTEGER,
+                        FOREIGN KEY (country_id) REFERENCES Countries(id)
+                    );
+                ''')
+
+                # Players
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS Players (
+                        id INTEGER PRIMARY KEY,
+                        first_name TEXT,
+                        last_name TEXT,
+                        display_name TEXT,
+                        first_name_he TEXT,
+                        last_name_he TEXT,
+                        display_name_he TEXT,
+                        image TEXT,
+                        date_of_birth TEXT,
+                        height INTEGER,
+                        weight INTEGER,
+                        nationality_id INTEGER,
+                        FOREIGN KEY (nationality_id) REFERENCES Countries(id)
+                    );
+                ''')
+
+                # Positions
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS Positions (
+                        id INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL
+                    );
+                ''')
+
+                # Player-Team-Season link
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS PlayerTeamSeason (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        player_id INTEGER NOT NULL,
+                        team_id INTEGER NOT NULL,
+                        season_id INTEGER NOT NULL,
+                        position_id INTEGER,
+                        shirt_number INTEGER,
+                        is_captain BOOLEAN,
+                        FOREIGN KEY (player_id) REFERENCES Players(id),
+                        FOREIGN KEY (team_id) REFERENCES Teams(id),
+                        FOREIGN KEY (season_id) REFERENCES Seasons(id),
+                        FOREIGN KEY (position_id) REFERENCES Positions(id)
+                    );
+                ''')
+
+                # Games
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS Games (
+                        id           INTEGER PRIMARY KEY AUTOINCREMENT,
+                        created_at   DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        activate_at  DATETIME,
+                        distance     JSON,
+                        max_rank    INTEGER,
+                        hint        TEXT,
+                        leagues     JSON,
+                        players_hash TEXT,
+                        game_number INTEGER
+                    );
+                ''')
+
+                # Autocomplete player lists of games, stored once per content hash
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS PlayerLists (
+                        hash    TEXT PRIMARY KEY,
+                        players TEXT NOT NULL
+                    );
+                ''')
+
+                # Game rankings, one row per player
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS GameRanks (
+                        game_id   INTEGER NOT NULL,
+                        player_id INTEGER NOT NULL,
+                        rank      INTEGER NOT NULL,
+                        PRIMARY KEY (game_id, player_id),
+                        FOREIGN KEY (game_id) REFERENCES Games(id) ON DELETE CASCADE
+                    ) WITHOUT ROWID;
+                ''')
+
+                # Versions of derived data (e.g. the player feature index)
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS DataVersions (
+                        name    TEXT PRIMARY KEY,
+                        version INTEGER NOT NULL
+                    );
+                ''')
+
+                # Background admin jobs
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS Jobs (
+                        id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                        kind        TEXT NOT NULL,
+                        status      TEXT NOT NULL,
+                        payload     JSON,
+                        result      JSON,
+                        error       TEXT,
+                        created_at  DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        updated_at  DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        owner       TEXT,
+                        heartbeat_at DATETIME
+                    );
+                ''')
+
+                # SportMonks squads already stored, team_id 0 marks a fully synced season
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS SyncState (
+                        season_id  INTEGER NOT NULL,
+                        team_id    INTEGER NOT NULL,
+                        checksum   TEXT,
+                        synced_at  DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (season_id, team_id)
+                    ) WITHOUT ROWID;
+                ''')
+
+                # Hebrew translations of normalised names (kind 'full') and name tokens (kind 'token')
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS TranslationMemo (
+                        kind    TEXT NOT NULL,
+                        source  TEXT NOT NULL,
+                        hebrew  TEXT NOT NULL,
+                        PRIMARY KEY (kind, source)
+                    ) WITHOUT ROWID;
+                ''')
+
+                conn.commit()
+            elif self.db_type == "postgresql":
+                # Countries
+                cursor.execute('''
+                            CREATE TABLE IF NOT EXISTS Countries (
+                                id BIGSERIAL PRIMARY KEY,
+                                name TEXT NOT NULL,
+                                image TEXT
+                            );
+                        ''')
+
+                # Leagues
+                cursor.execute('''
+                            CREATE TABLE IF NOT EXISTS Leagues (
+                                id BIGSERIAL PRIMARY KEY,
+                                name TEXT NOT NULL,
+                                image TEXT,
+                                sub_type TEXT
+                            );
+                        ''')
+
+                # Seasons
+                cursor.execute('''
+                            CREATE TABLE IF NOT EXISTS Seasons (
+                                id BIGSERIAL PRIMARY KEY,
+                                league_id BIGINT NOT NULL,
+                                name TEXT NOT NULL,
+                                FOREIGN KEY (league_id) REFERENCES Leagues(id)
+                            );
+                        ''')
+
+                # Teams
+                cursor.execute('''
+                            CREATE TABLE IF NOT EXISTS Teams (
+                                id BIGSERIAL PRIMARY KEY,
+                                name TEXT NOT NULL,
+                                image TEXT,
+                                country_id BIGINT,
+                                FOREIGN KEY (country_id) REFERENCES Countries(id)
+                            );
+                        ''')
+
+                # Players
+                cursor.execute('''
+                            CREATE TABLE IF NOT EXISTS Players (
+                                id BIGSERIAL PRIMARY KEY,
+                                first_name TEXT,
+                                last_name TEXT,
+                                display_name TEXT,
+                                first_name_he TEXT,
+                                last_name_he TEXT,
+                                display_name_he TEXT,
+                                image TEXT,
+                                date_of_birth DATE,
+                                height INTEGER,
+                                weight INTEGER,
+                                nationality_id BIGINT,
+                                FOREIGN KEY (nationality_id) REFERENCES Countries(id)
+                            );
+                        ''')
+
+                # Positions
+                cursor.execute('''
+                            CREATE TABLE IF NOT EXISTS Positions (
+                                id BIGSERIAL PRIMARY KEY,
+                                name TEXT NOT NULL
+                            );
+                        ''')
+
+                # Player-Team-Season link
+                cursor.execute('''
+                            CREATE TABLE IF NOT EXISTS PlayerTeamSeason (
+                                id BIGSERIAL PRIMARY KEY,
+                                player_id BIGINT NOT NULL,
+                                team_id BIGINT NOT NULL,
+                                season_id BIGINT NOT NULL,
+                                position_id BIGINT,
+                                shirt_number INTEGER,
+                                is_captain BOOLEAN,
+                                FOREIGN KEY (player_id) REFERENCES Players(id),
+                                FOREIGN KEY (team_id) REFERENCES Teams(id),
+                                FOREIGN KEY (season_id) REFERENCES Seasons(id),
+                                FOREIGN KEY (position_id) REFERENCES Positions(id)
+                            );
+                        ''')
+
+                # Games
+                cursor.execute('''
+                            CREATE TABLE IF NOT EXISTS Games (
+                                id           BIGSERIAL PRIMARY KEY,
+                                created_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                activate_at  TIMESTAMP,
+                                distance     JSONB,
+                                max_rank     INTEGER,
+                                hint         TEXT,
+                                leagues      JSONB,
+                                players_hash TEXT,
+                                game_number  INTEGER
+                            );
+                        ''')
+
+                # Autocomplete player lists of games, stored once per content hash
+                cursor.execute('''
+                            CREATE TABLE IF NOT EXISTS PlayerLists (
+                                hash     TEXT PRIMARY KEY,
+                                players  TEXT NOT NULL
+                            );
+                        ''')
+
+                # Game rankings, one row per player
+                cursor.execute('''
+                            CREATE TABLE IF NOT EXISTS GameRanks (
+                                game_id      BIGINT NOT NULL,
+                                player_id    BIGINT NOT NULL,
+                                rank         INTEGER NOT NULL,
+                                PRIMARY KEY (game_id, player_id),
+                                FOREIGN KEY (game_id) REFERENCES Games(id) ON DELETE CASCADE
+                            );
+                        ''')
+
+                # Versions of derived data (e.g. the player feature index)
+                cursor.execute('''
+                            CREATE TABLE IF NOT EXISTS DataVersions (
+                                name     TEXT PRIMARY KEY,
+                                version  INTEGER NOT NULL
+                            );
+                        ''')
+
+                # Background admin jobs
+                cursor.execute('''
+                            CREATE TABLE IF NOT EXISTS Jobs (
+                                id           BIGSERIAL PRIMARY KEY,
+                                kind         TEXT NOT NULL,
+                                status       TEXT NOT NULL,
+                                payload      JSONB,
+                                result       JSONB,
+                                error        TEXT,
+                                created_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                updated_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                owner        TEXT,
+                                heartbeat_at TIMESTAMP
+                            );
+                        ''')
+
+                # SportMonks squads already stored, team_id 0 marks a fully synced season
+                cursor.execute('''
+                            CREATE TABLE IF NOT EXISTS SyncState (
+                                season_id    BIGINT NOT NULL,
+                                team_id      BIGINT NOT NULL,
+                                checksum     TEXT,
+                                synced_at    TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                PRIMARY KEY (season_id, team_id)
+                            );
+                        ''')
+
+                # Hebrew translations of normalised names (kind 'full') and name tokens (kind 'token')
+                cursor.execute('''
+                            CREATE TABLE IF NOT EXISTS TranslationMemo (
+                                kind     TEXT NOT NULL,
+                                source   TEXT NOT NULL,
+                                hebrew   TEXT NOT NULL,
+                                PRIMARY KEY (kind, source)
+                            );
+                        ''')
+
+                conn.commit()
+
+            self.__dedupe_player_team_season()
+            self.__create_indexes()
+            self.__backfill_game_ranks()
+            self.__move_game_player_lists()
+            self.__create_player_search_index()
+            self.__add_job_owners()
+
+    def __add_job_owners(self):
+        """
+        Migration: Jobs rows record the worker running them and its last heartbeat, see JobQueue.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            if "owner" in self.__table_columns(cursor, "Jobs"):
+                return
+
+            if self.db_type == "sqlite":
+                cursor.execute("BEGIN IMMEDIATE")
+                if "owner" in self.__table_columns(cursor, "Jobs"):
+                    conn.rollback()
+                    return
+                cursor.execute("ALTER TABLE Jobs ADD COLUMN owner TEXT")
+                cursor.execute("ALTER TABLE Jobs ADD COLUMN heartbeat_at DATETIME")
+            else:
+                cursor.execute("ALTER TABLE Jobs ADD COLUMN IF NOT EXISTS owner TEXT")
+                cursor.execute("ALTER TABLE Jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP")
+            conn.commit()
+
+    def __create_player_search_index(self):
+        """
+        Substring search over the Hebrew and Latin names: an FTS5 trigram table kept in sync by triggers on SQLite, a
+        pg_trgm GIN index on PostgreSQL.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+
+            if self.db_type == "sqlite":
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'PlayerSearch'")
+                if cursor.fetchone():
+                    return
+
+                columns = ", ".join(self.SEARCH_COLUMNS)
+                new_values = ", ".join(f"new.{column}" for column in self.SEARCH_COLUMNS)
+                old_values = ", ".join(f"old.{column}" for column in self.SEARCH_COLUMNS)
+
+                # IF NOT EXISTS: workers starting together may both get here, a second rebuild is harmless
+                cursor.execute(f"""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS PlayerSearch USING fts5(
+                        {columns}, content='Players', content_rowid='id', tokenize='trigram'
+                    )
+                """)
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS players_search_insert AFTER INSERT ON Players BEGIN
+                        INSERT INTO PlayerSearch (rowid, {columns}) VALUES (new.id, {new_values});
+                    END
+                """)
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS players_search_delete AFTER DELETE ON Players BEGIN
+                        INSERT INTO PlayerSearch (PlayerSearch, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+                    END
+                """)
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS players_search_update AFTER UPDATE ON Players BEGIN
+                        INSERT INTO PlayerSearch (PlayerSearch, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+                        INSERT INTO PlayerSearch (rowid, {columns}) VALUES (new.id, {new_values});
+                    END
+                """)
+                cursor.execute("INSERT INTO PlayerSearch (PlayerSearch) VALUES ('rebuild')")
+            else:
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                cursor.execute(f"""
+                    CREATE INDEX IF NOT EXISTS ix_players_search_trgm ON Players
+                    USING GIN (({self.SEARCH_DOCUMENT}) gin_trgm_ops)
+                """)
+
+            conn.commit()
+
+    def __dedupe_player_team_season(self):
+        """
+        Migration: reruns of the import used to append duplicate PlayerTeamSeason links. Keep the first of each
+        (player, team, season) and make the triple unique so imports can upsert it.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            if self.db_type == "sqlite":
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'ux_pts_player_team_season'")
+            else:
+                cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = 'ux_pts_player_team_season'")
+            if cursor.fetchone():
+                return
+
+            cursor.execute("""
+                DELETE FROM PlayerTeamSeason WHERE id NOT IN (
+                    SELECT MIN(id) FROM PlayerTeamSeason GROUP BY player_id, team_id, season_id
+                )
+            """)
+            removed = cursor.rowcount
+            cursor.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS ux_pts_player_team_season ON PlayerTeamSeason (player_id, team_id, season_id)
+            """)
+            conn.commit()
+
+            if removed > 0:
+                print(f"Removed {removed} duplicate PlayerTeamSeason rows")
+                self.bump_data_version("roster")
+
+    def __create_indexes(self):
+        """
+        Migration: create the INDEXES added since the last start.
+        """
+        created = self.get_data_version("schema_indexes")
+        if created >= len(self.INDEXES):
+            return
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            for statement in self.INDEXES[created:]:
+                cursor.execute(statement)
+
+            # Workers starting together may all get here: never move the version back, never past INDEXES
+            greatest = "MAX" if self.db_type == "sqlite" else "GREATEST"
+            cursor.execute(f"""
+                INSERT INTO DataVersions (name, version) VALUES ('schema_indexes', {self.param_key})
+                ON CONFLICT (name) DO UPDATE SET version = {greatest}(DataVersions.version, excluded.version)
+            """, (len(self.INDEXES),))
+            conn.commit()
 
+            print(f"✅ Created {len(self.INDEXES) - created} indexes")
+
+    BOUNDED_WALKS = ("customer_game", "countdown")
+
+    def check_query_plans(self):
+        """
+        EXPLAIN the hot queries: the game lookups, the countdown, ranks, renumbering and the league players join.
+
+        Returns {name: (uses_indexes, plan lines)}. A plan fails when it reads a whole table or walks a whole index
+        without a search condition. On PostgreSQL sequential scans are disabled first, so they only show up where no
+        index applies.
+
+        Index walks are accepted in BOUNDED_WALKS only: the highest number of an active game is found by walking
+        ix_games_game_number down from the last game to the first active one, which reads just the games scheduled
+        ahead, however long the history grows.
+        """
+        now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        key = self.param_key
+        queries = {
+            "customer_game": (f"""
+                SELECT g.id, (SELECT MAX(game_number) FROM Games WHERE activate_at <= {key}) FROM Games g
+                WHERE g.game_number = {key} AND g.activate_at <= {key} ORDER BY g.activate_at DESC LIMIT 1
+            """, (now, 1, now)),
+            "latest_game": (f"SELECT id FROM Games WHERE activate_at <= {key} ORDER BY activate_at DESC LIMIT 1", (now,)),
+            "countdown": (f"""
+                SELECT activate_at FROM Games g WHERE game_number > (
+                    SELECT game_number FROM Games WHERE activate_at < {key} ORDER BY game_number DESC LIMIT 1
+                ) ORDER BY game_number ASC LIMIT 1
+            """, (now,)),
+            "player_rank": (f"""
+                SELECT r.rank FROM Games g INNER JOIN GameRanks r ON r.game_id = g.id AND r.player_id = {key}
+                WHERE g.game_number = {key} AND g.activate_at < {key}
+            """, (1, 1, now)),
+            "game_ranking": (f"""
+                SELECT r.player_id, r.rank FROM Games g LEFT JOIN GameRanks r ON r.game_id = g.id
+                WHERE g.game_number = {key} AND g.activate_at < {key} ORDER BY r.player_id
+            """, (1, now)),
+            "renumbering": (self.__future_games_numbering(), (now, now)),
+            "league_players": (f"""
+                SELECT DISTINCT(P.id) FROM Players P
+                INNER JOIN PlayerTeamSeason PS ON PS.player_id = P.id
+                INNER JOIN Seasons S ON S.id = PS.season_id AND S.league_id IN ({key}, {key})
+            """, (1, 2)),
+        }
+
+        plans = {}
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            if self.db_type == "postgresql":
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+            for name, (query, params) in queries.items():
+                if self.db_type == "sqlite":
+                    cursor.execute(f"EXPLAIN QUERY PLAN {query}", params)
+                    lines = [row[3] for row in cursor.fetchall()]
+                    # "SCAN (subquery-N)" reads an intermediate result, not a table
+                    scans = [line for line in lines if line.startswith("SCAN ") and not line.startswith("SCAN (")]
+                    table_scans = [line for line in scans if " USING " not in line]
+                else:
+                    cursor.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+                    nodes = list(self.__plan_nodes(cursor.fetchone()[0][0]["Plan"]))
+                    lines = [f"{node['Node Type']} on {node['Relation Name']}"
+                             + (f" using {node['Index Name']}" if "Index Name" in node else "")
+                             + (f" ({node['Index Cond']})" if "Index Cond" in node else "")
+                             if "Relation Name" in node else node["Node Type"] for node in nodes]
+                    scans = [line for line, node in zip(lines, nodes)
+                             if "Relation Name" in node and "Index Cond" not in node and "Bitmap" not in node["Node Type"]]
+                    table_scans = [line for line in scans if line.startswith("Seq Scan")]
+
+                plans[name] = (not (table_scans if name in self.BOUNDED_WALKS else scans), lines)
+
+            conn.rollback()
+
+        return plans
+
+    @classmethod
+    def __plan_nodes(cls, node):
+        yield node
+        for child in node.get("Plans", ()):
+            yield from cls.__plan_nodes(child)
+
+    def __backfill_game_ranks(self):
+        """
+        Migration: games created before GameRanks existed only have their ranking in Games.distance.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT g.id, g.distance FROM Games g
+                WHERE g.distance IS NOT NULL AND NOT EXISTS (SELECT 1 FROM GameRanks r WHERE r.game_id = g.id)
+            """)
+            games = cursor.fetchall()
+
+            for game_id, distance in games:
+                self._insert_game_ranks(cursor, game_id, distance if type(distance) == list else json.loads(distance))
+
+            if games:
+                print(f"Backfilled GameRanks for {len(games)} games")
+            conn.commit()
+
+    def __move_game_player_lists(self):
+        """
+        Migration: games used to carry their own copy of the player list in Games.players. Move each distinct list
+        to PlayerLists and keep only its hash on the game.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            if "players" not in self.__table_columns(cursor, "Games"):
+                return
+
+            # Workers starting together: the first one migrates, the others wait and find nothing left to do
+            if self.db_type == "sqlite":
+                cursor.execute("BEGIN IMMEDIATE")
+            else:
+                cursor.execute("LOCK TABLE Games IN ACCESS EXCLUSIVE MODE")
+            columns = self.__table_columns(cursor, "Games")
+            if "players" not in columns:
+                conn.rollback()
+                return
+
+            if "players_hash" not in columns:
+                cursor.execute("ALTER TABLE Games ADD COLUMN players_hash TEXT")
+
+            cursor.execute("SELECT id FROM Games WHERE players IS NOT NULL")
+            game_ids = [row[0] for row in cursor.fetchall()]
+
+            # One game at a time, the lists are large
+            for game_id in game_ids:
+                cursor.execute(f"SELECT players FROM Games WHERE id = {self.param_key}", (game_id,))
+                players = cursor.fetchone()[0]
+                if not isinstance(players, str):
+                    players = json.dumps(players, ensure_ascii=False)
+
+                cursor.execute(f"UPDATE Games SET players_hash = {self.param_key} WHERE id = {self.param_key}",
+                               (self._store_player_list(cursor, players), game_id))
+
+            cursor.execute("ALTER TABLE Games DROP COLUMN players")
+            conn.commit()
+
+            cursor.execute("SELECT COUNT(*) FROM PlayerLists")
+            print(f"Moved the player lists of {len(game_ids)} games to {cursor.fetchone()[0]} PlayerLists rows")
+
+    def __table_columns(self, cursor, table: str):
         if self.db_type == "sqlite":
-            # Countries
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS Countries (
-                    id INTEGER PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    image TEXT
-                );
-            ''')
-
-            # Leagues
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS Leagues (
-                    id INTEGER PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    image TEXT,
-                    sub_type TEXT
-                );
-            ''')
-
-            # Seasons
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS Seasons (
-                    id INTEGER PRIMARY KEY,
-                    league_id INTEGER NOT NULL,
-                    name TEXT NOT NULL,
-                    FOREIGN KEY (league_id) REFERENCES Leagues(id)
-                );
-            ''')
-
-            # Teams
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS Teams (
-                    id INTEGER PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    image TEXT,
-                    country_id INTEGER,
-                    FOREIGN KEY (country_id) REFERENCES Countries(id)
-                );
-            ''')
-
-            # Players
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS Players (
-                    id INTEGER PRIMARY KEY,
-                    first_name TEXT,
-                    last_name TEXT,
-                    display_name TEXT,
-                    first_name_he TEXT,
-                    last_name_he TEXT,
-                    display_name_he TEXT,
-                    image TEXT,
-                    date_of_birth TEXT,
-                    height INTEGER,
-                    weight INTEGER,
-                    nationality_id INTEGER,
-                    FOREIGN KEY (nationality_id) REFERENCES Countries(id)
-                );
-            ''')
-
-            # Positions
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS Positions (
-                    id INTEGER PRIMARY KEY,
-                    name TEXT NOT NULL
-                );
-            ''')
-
-            # Player-Team-Season link
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS PlayerTeamSeason (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    player_id INTEGER NOT NULL,
-                    team_id INTEGER NOT NULL,
-                    season_id INTEGER NOT NULL,
-                    position_id INTEGER,
-                    shirt_number INTEGER,
-                    is_captain BOOLEAN,
-                    FOREIGN KEY (player_id) REFERENCES Players(id),
-                    FOREIGN KEY (team_id) REFERENCES Teams(id),
-                    FOREIGN KEY (season_id) REFERENCES Seasons(id),
-                    FOREIGN KEY (position_id) REFERENCES Positions(id)
-                );
-            ''')
-
-            # Games
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS Games (
-                    id           INTEGER PRIMARY KEY AUTOINCREMENT,
-                    created_at   DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    activate_at  DATETIME,
-                    distance     JSON,
-                    max_rank    INTEGER
-                    hint        TEXT
-                    leagues     JSON
-                    players     JSON
-                    game_number INTEGER
-                );
-            ''')
-
-            self.conn.commit()
-        elif self.db_type == "postgresql":
-            # Countries
-            cursor.execute('''
-                        CREATE TABLE IF NOT EXISTS Countries (
-                            id BIGSERIAL PRIMARY KEY,
-                            name TEXT NOT NULL,
-                            image TEXT
-                        );
-                    ''')
-
-            # Leagues
-            cursor.execute('''
-                        CREATE TABLE IF NOT EXISTS Leagues (
-                            id BIGSERIAL PRIMARY KEY,
-                            name TEXT NOT NULL,
-                            image TEXT,
-                            sub_type TEXT
-                        );
-                    ''')
-
-            # Seasons
-            cursor.execute('''
-                        CREATE TABLE IF NOT EXISTS Seasons (
-                            id BIGSERIAL PRIMARY KEY,
-                            league_id BIGINT NOT NULL,
-                            name TEXT NOT NULL,
-                            FOREIGN KEY (league_id) REFERENCES Leagues(id)
-                        );
-                    ''')
-
-            # Teams
-            cursor.execute('''
-                        CREATE TABLE IF NOT EXISTS Teams (
-                            id BIGSERIAL PRIMARY KEY,
-                            name TEXT NOT NULL,
-                            image TEXT,
-                            country_id BIGINT,
-                            FOREIGN KEY (country_id) REFERENCES Countries(id)
-                        );
-                    ''')
-
-            # Players
-            cursor.execute('''
-                        CREATE TABLE IF NOT EXISTS Players (
-                            id BIGSERIAL PRIMARY KEY,
-                            first_name TEXT,
-                            last_name TEXT,
-                            display_name TEXT,
-                            first_name_he TEXT,
-                            last_name_he TEXT,
-                            display_name_he TEXT,
-                            image TEXT,
-                            date_of_birth DATE,
-                            height INTEGER,
-                            weight INTEGER,
-                            nationality_id BIGINT,
-                            FOREIGN KEY (nationality_id) REFERENCES Countries(id)
-                        );
-                    ''')
-
-            # Positions
-            cursor.execute('''
-                        CREATE TABLE IF NOT EXISTS Positions (
-                            id BIGSERIAL PRIMARY KEY,
-                            name TEXT NOT NULL
-                        );
-                    ''')
-
-            # Player-Team-Season link
-            cursor.execute('''
-                        CREATE TABLE IF NOT EXISTS PlayerTeamSeason (
-                            id BIGSERIAL PRIMARY KEY,
-                            player_id BIGINT NOT NULL,
-                            team_id BIGINT NOT NULL,
-                            season_id BIGINT NOT NULL,
-                            position_id BIGINT,
-                            shirt_number INTEGER,
-                            is_captain BOOLEAN,
-                            FOREIGN KEY (player_id) REFERENCES Players(id),
-                            FOREIGN KEY (team_id) REFERENCES Teams(id),
-                            FOREIGN KEY (season_id) REFERENCES Seasons(id),
-                            FOREIGN KEY (position_id) REFERENCES Positions(id)
-                        );
-                    ''')
-
-            # Games
-            cursor.execute('''
-                        CREATE TABLE IF NOT EXISTS Games (
-                            id           BIGSERIAL PRIMARY KEY,
-                            created_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            activate_at  TIMESTAMP,
-                            distance     JSONB,
-                            max_rank     INTEGER,
-                            hint         TEXT,
-                            leagues      JSONB,
-                            players      JSONB,
-                            game_number  INTEGER
-                        );
-                    ''')
-
-    def __update_games_number(self):
-        # Update game numbers for future games
-        cursor = self.conn.cursor()
+            cursor.execute(f"SELECT name FROM pragma_table_info('{table}')")
+        else:
+            cursor.execute("SELECT column_name FROM information_schema.columns "
+                           f"WHERE table_schema = current_schema() AND table_name = '{table.lower()}'")
+        return {row[0].lower() for row in cursor.fetchall()}
+
+    def _store_player_list(self, cursor, players: str) -> str:
+        """
+        Store a JSON player list unless the same content is already there. Returns its hash.
+        """
+        players_hash = hashlib.sha256(players.encode("utf-8")).hexdigest()
         cursor.execute(f"""
-                    WITH updated_games AS (
-                        SELECT id, 
-                               ROW_NUMBER() OVER (ORDER BY activate_at) AS new_game_number
-                        FROM Games
-                    )
-                    UPDATE Games
-                    SET game_number = (SELECT new_game_number FROM updated_games WHERE updated_games.id = Games.id)
-                    WHERE activate_at > {self.param_key}
-                """, (datetime.now().date(),))
-        self.conn.commit()
+            INSERT INTO PlayerLists (hash, players) VALUES ({self.param_key}, {self.param_key})
+            ON CONFLICT (hash) DO NOTHING
+        """, (players_hash, players))
+
+        return players_hash
+
+    def get_player_list(self, players_hash: str) -> Optional[str]:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT players FROM PlayerLists WHERE hash = {self.param_key}", (players_hash,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+    def _insert_game_ranks(self, cursor, game_id: int, distance):
+        rows = [(game_id, item["id"], item["rank"]) for item in distance]
+
+        # Idempotent: every gunicorn worker runs the backfill at startup, possibly for the same games
+        if self.db_type == "postgresql":
+            execute_values(cursor, "INSERT INTO GameRanks (game_id, player_id, rank) VALUES %s "
+                                   "ON CONFLICT (game_id, player_id) DO NOTHING", rows, page_size=1000)
+        else:
+            cursor.executemany("INSERT INTO GameRanks (game_id, player_id, rank) VALUES (?, ?, ?) "
+                               "ON CONFLICT (game_id, player_id) DO NOTHING", rows)
+
+    def __future_games_numbering(self):
+        """
+        Query numbering the games after today by activation order, offset by the number of earlier games.
+        """
+        return f"""
+            SELECT id, game_number,
+                   (SELECT COUNT(*) FROM Games WHERE activate_at <= {self.param_key})
+                   + ROW_NUMBER() OVER (ORDER BY activate_at, id) AS new_game_number
+            FROM Games
+            WHERE activate_at > {self.param_key}
+        """
+
+    def __update_games_number(self, cursor):
+        """
+        Renumber the games after today by activation order, in the caller's transaction. Only games whose number
+        changed are written. Returns their (old, new) game numbers; old is None for a new game.
+        """
+        today = datetime.now().date()
+        cursor.execute(self.__future_games_numbering(), (today, today))
+        moves = {game_id: (old, new) for game_id, old, new in cursor.fetchall() if old != new}
+        if not moves:
+            return []
+
+        cases = " ".join(f"WHEN {self.param_key} THEN {self.param_key}" for _ in moves)
+        placeholders = ",".join([self.param_key] * len(moves))
+        cursor.execute(f"UPDATE Games SET game_number = CASE id {cases} END WHERE id IN ({placeholders})",
+                       [value for game_id, (_, new) in moves.items() for value in (game_id, new)] + list(moves))
+
+        return list(moves.values())
+
+    def get_data_version(self, name: str) -> int:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT version FROM DataVersions WHERE name = {self.param_key}", (name,))
+            row = cursor.fetchone()
+            return row[0] if row else 0
+
+    def get_data_versions(self) -> dict:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name, version FROM DataVersions")
+            return dict(cursor.fetchall())
+
+    def bump_data_version(self, name: str):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                INSERT INTO DataVersions (name, version) VALUES ({self.param_key}, 1)
+                ON CONFLICT (name) DO UPDATE SET version = DataVersions.version + 1
+            """, (name,))
+            conn.commit()
+
+    def _insert_ignore(self, cursor, table: str, columns, rows):
+        """
+        Bulk insert ``rows``, skipping those whose key already exists (``INSERT OR IGNORE``, written as
+        ``ON CONFLICT DO NOTHING`` so the same statement runs on both backends).
+        """
+        if not rows:
+            return 0
 
-    def populate_database(self, api_client, league_id):
-        cursor = self.conn.cursor()
+        if self.db_type == "postgresql":
+            execute_values(cursor, f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s ON CONFLICT DO NOTHING",
+                           rows, page_size=1000)
+        else:
+            placeholders = ", ".join([self.param_key] * len(columns))
+            cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+                               f"ON CONFLICT DO NOTHING", rows)
 
+        return len(rows)
+
+    def _upsert_rows(self, cursor, table: str, columns, key, rows):
+        """
+        Bulk insert ``rows`` in order, updating the other columns of rows whose ``key`` already exists. PostgreSQL
+        COPYs them into a temporary table first and upserts from there.
+        """
+        if not rows:
+            return 0
+
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns if column not in key)
+        conflict = f"ON CONFLICT ({', '.join(key)}) DO UPDATE SET {updates}"
+
+        if self.db_type == "postgresql":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+
+            cursor.execute("DROP TABLE IF EXISTS upsert_load")
+            cursor.execute(f"CREATE TEMP TABLE upsert_load ON COMMIT DROP AS "
+                           f"SELECT {', '.join(columns)} FROM {table} WITH NO DATA")
+            cursor.execute("ALTER TABLE upsert_load ADD COLUMN load_order BIGSERIAL")
+            cursor.copy_expert(f"COPY upsert_load ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+            cursor.execute(f"INSERT INTO {table} ({', '.join(columns)}) "
+                           f"SELECT {', '.join(columns)} FROM upsert_load ORDER BY load_order {conflict}")
+        else:
+            placeholders = ", ".join([self.param_key] * len(columns))
+            cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) {conflict}", rows)
+
+        return len(rows)
+
+    def get_sync_state(self):
+        """
+        Checksums of the stored squads by (season_id, team_id).
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT season_id, team_id, checksum FROM SyncState")
+            return {(season_id, team_id): checksum for season_id, team_id, checksum in cursor.fetchall()}
+
+    def populate_database(self, api_client, league_id, full: bool = False):
+        """
+        Import a league's seasons, teams and squads from SportMonks.
+
+        Incremental unless ``full``: finished seasons that were synced before are skipped without a request, and of
+        the other seasons only squads whose checksum changed are written. Links are upserted, so reruns never
+        duplicate them. Squads are written in batches while the next ones are still being fetched.
+
+        A failed request aborts the run, and the season being imported is rolled back. An empty squad for a team
+        that had players isn't trusted: its links are kept, and a finished season stays unsynced so the next run
+        fetches it again.
+        """
         league_seasons = api_client.get_seasons_by_league(league_id)
 
-        # --- Insert League ---
+        # --- League ---
         league_id = league_seasons['id']
-        league_name = league_seasons['name']
-        league_image = league_seasons['image_path']
-        sub_type = league_seasons['sub_type']
+        league = (league_id, league_seasons['name'], league_seasons['image_path'], league_seasons['sub_type'])
+
+        synced = {} if full else self.get_sync_state()
+        roster_changed = False
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            self._insert_ignore(cursor, "Leagues", ("id", "name", "image", "sub_type"), [league])
+
+            # --- Seasons ---
+            for season in sorted(league_seasons['seasons'], key=lambda x: x["starting_at"], reverse=True):
+                season_id = season['id']
+                season_name = season['name']
+                finished = bool(season.get('finished'))
+
+                if finished and (season_id, 0) in synced:
+                    print(f"Season {season_name} already synced")
+                    continue
+
+                print(f"Season {season_name}")
+                print("------------------------------")
+
+                self._insert_ignore(cursor, "Seasons", ("id", "league_id", "name"),
+                                    [(season_id, league_id, season_name)])
+
+                batch = self.__new_squad_batch()
+                rows, write_time = 0, 0.0
+                complete = True
+                now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+                season_teams = api_client.get_teams_by_season(season_id)
+                team_ids = [team['id'] for team in season_teams]
+                with closing(api_client.iter_players_by_season_teams(season_id, team_ids)) as squads:
+                    for team, pages in zip(season_teams, squads):
+                        team_id = team['id']
+                        country = team['country']
+
+                        # The squad arrives page by page: collect its rows, and its checksum over the whole squad
+                        squad = self.__new_squad_batch()
+                        digest = hashlib.sha256()
+                        team_players = 0
+                        for page in pages:
+                            for team_player in page:
+                                # Hashes the same bytes as json.dumps of the whole squad list
+                                digest.update(b", " if team_players else b"[")
+                                digest.update(json.dumps(team_player, sort_keys=True).encode("utf-8"))
+                                team_players += 1
+                                self.__collect_squad_player(squad, team_id, season_id, team_player)
+                        digest.update(b"]" if team_players else b"[]")
+
+                        if not team_players and (season_id, team_id) in synced:
+                            print(f"{team['name']}: empty squad, keeping the stored one")
+                            complete = False
+                            continue
+
+                        checksum = digest.hexdigest()
+                        if synced.get((season_id, team_id)) == checksum:
+                            continue
+                        batch["synced"].append((season_id, team_id, checksum, now))
+                        roster_changed = True
+
+                        # Keyed by id, the first occurrence wins like INSERT OR IGNORE did
+                        batch["countries"].setdefault(country['id'],
+                                                      (country['id'], country['name'], country['image_path']))
+                        batch["teams"].setdefault(team_id, (team_id, team['name'], team['image_path'], country['id']))
+                        for name in ("countries", "positions", "players", "links"):
+                            for key, row in squad[name].items():
+                                batch[name].setdefault(key, row)
+
+                        print(f"{team['name']} / {team_players} players")
+
+                        # Write full batches while the remaining squads are still downloading
+                        if len(batch["links"]) >= INGEST_BATCH_ROWS:
+                            started = time.perf_counter()
+                            rows += self.__write_squad_batch(cursor, season_id, batch, synced)
+                            write_time += time.perf_counter() - started
+                            batch = self.__new_squad_batch()
+
+                if finished and complete:
+                    batch["synced"].append((season_id, 0, None, now))
+
+                started = time.perf_counter()
+                rows += self.__write_squad_batch(cursor, season_id, batch, synced)
+                conn.commit()
+                write_time += time.perf_counter() - started
+
+                print(f"Wrote {rows} rows in {write_time:.2f}s ({rows / max(write_time, 1e-6):.0f} rows/s)")
+                print("\n")
+
+        if roster_changed:
+            # Roster changed, stale the player feature index
+            self.bump_data_version("roster")
+
+    @staticmethod
+    def __collect_squad_player(batch, team_id, season_id, team_player):
+        """Add a squad entry's player, nationality, position and link to ``batch``, first occurrence wins."""
+        player = team_player['player']
+
+        nationality = player['nationality']
+        if nationality:
+            nat_id = nationality['id']
+            batch["countries"].setdefault(nat_id, (nat_id, nationality['name'], nationality['image_path']))
+        else:
+            nat_id = None
 
-        cursor.execute(f"""
-            INSERT OR IGNORE INTO Leagues (id, name, image, sub_type)
-            VALUES ({self.param_key}, {self.param_key}, {self.param_key}, {self.param_key})
-        """, (league_id, league_name, league_image, sub_type))
+        batch["players"].setdefault(player['id'], (
+            player['id'], player['firstname'], player['lastname'], player.get('display_name'),
+            player.get('image_path', None), player['date_of_birth'], player.get('height', None),
+            player.get('weight', None), nat_id))
 
-        # --- Iterate over Seasons ---
-        for season in sorted(league_seasons['seasons'], key=lambda x: x["starting_at"], reverse=True):
-            season_id = season['id']
-            season_name = season['name']
+        position = team_player['position']
+        if position:
+            pos_id = position['id']
+            batch["positions"].setdefault(pos_id, (pos_id, position['name']))
+        else:
+            pos_id = None
 
-            print(f"Season {season_name}")
-            print("------------------------------")
+        is_captain = any(
+            detail.get("type", {}).get("code") == "captain"
+            for detail in team_player.get('details', None)
+        )
 
-            cursor.execute(f"""
-                INSERT OR IGNORE INTO Seasons (id, league_id, name)
-                VALUES ({self.param_key}, {self.param_key}, {self.param_key})
-            """, (season_id, league_id, season_name))
+        batch["links"].setdefault((player['id'], team_id), (
+            player['id'], team_id, season_id, pos_id, team_player.get('jersey_number'), is_captain))
 
-            teams = api_client.get_teams_by_season(season_id)
-            for team in teams:
-                team_id = team['id']
-                team_name = team['name']
-                team_image = team['image_path']
+    @staticmethod
+    def __new_squad_batch():
+        return {"countries": {}, "teams": {}, "positions": {}, "players": {}, "links": {}, "synced": []}
 
-                country = team['country']
-                country_id = country['id']
-                country_name = country['name']
-                country_image = country['image_path']
+    def __write_squad_batch(self, cursor, season_id, batch, synced):
+        """
+        Write the entities, links and sync state collected for some of a season's squads. Returns the row count.
+        """
+        rows = self._insert_ignore(cursor, "Countries", ("id", "name", "image"), list(batch["countries"].values()))
+        rows += self._insert_ignore(cursor, "Teams", ("id", "name", "image", "country_id"),
+                                    list(batch["teams"].values()))
+        rows += self._insert_ignore(cursor, "Positions", ("id", "name"), list(batch["positions"].values()))
+        rows += self._insert_ignore(cursor, "Players", ("id", "first_name", "last_name", "display_name", "image",
+                                                        "date_of_birth", "height", "weight", "nationality_id"),
+                                    list(batch["players"].values()))
+
+        # Players who left a squad since its last sync
+        for _, team_id, _, _ in batch["synced"]:
+            if team_id and (season_id, team_id) in synced:
+                squad = [player_id for player_id, link_team_id in batch["links"] if link_team_id == team_id]
+                keep = f" AND player_id NOT IN ({', '.join([self.param_key] * len(squad))})" if squad else ""
+                cursor.execute(f"DELETE FROM PlayerTeamSeason WHERE season_id = {self.param_key} "
+                               f"AND team_id = {self.param_key}{keep}", [season_id, team_id] + squad)
+
+        rows += self._upsert_rows(cursor, "PlayerTeamSeason", ("player_id", "team_id", "season_id", "position_id",
+                                                               "shirt_number", "is_captain"),
+                                  ("player_id", "team_id", "season_id"), list(batch["links"].values()))
+
+        self._upsert_rows(cursor, "SyncState", ("season_id", "team_id", "checksum", "synced_at"),
+                          ("season_id", "team_id"), batch["synced"])
+
+        return rows
+
+    def _fetch_all(self, query: str, params=()):
+        """
+        Rows of ``query`` as plain dicts keyed by column name.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
-                cursor.execute(f"""
-                    INSERT OR IGNORE INTO Countries (id, name, image)
-                    VALUES ({self.param_key}, {self.param_key}, {self.param_key})
-                """, (country_id, country_name, country_image))
+    def _fetch_one(self, query: str, params=()):
+        """
+        First row of ``query`` as a dict, or None.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            row = cursor.fetchone()
+            return dict(zip([column[0] for column in cursor.description], row)) if row else None
 
-                cursor.execute(f"""
-                    INSERT OR IGNORE INTO Teams (id, name, image, country_id)
-                    VALUES ({self.param_key}, {self.param_key}, {self.param_key}, {self.param_key})
-                """, (team_id, team_name, team_image, country_id))
-
-                players = api_client.get_players_by_season_team(season_id, team_id)
-
-                print(f"{team_name} / {len(players)} players")
-
-                if players:
-                    for team_player in players:
-                        player = team_player['player']
-                        player_id = player['id']
-                        first_name = player['firstname']
-                        last_name = player['lastname']
-                        display_name = player.get('display_name')
-                        player_image = player.get('image_path', None)
-                        dob = player['date_of_birth']
-                        height = player.get('height', None)
-                        weight = player.get('weight', None)
-
-                        nationality = player['nationality']
-                        if nationality:
-                            nat_id = nationality['id']
-                            nat_name = nationality['name']
-                            nat_image = nationality['image_path']
-
-                            cursor.execute(f"""
-                                INSERT OR IGNORE INTO Countries (id, name, image)
-                                VALUES ({self.param_key}, {self.param_key}, {self.param_key})
-                            """, (nat_id, nat_name, nat_image))
-                        else:
-                            nat_id = None
-
-                        cursor.execute(f"""
-                            INSERT OR IGNORE INTO Players (id, first_name, last_name, display_name, image, date_of_birth, height, weight, nationality_id)
-                            VALUES ({self.param_key}, {self.param_key}, {self.param_key}, {self.param_key}, {self.param_key}, {self.param_key}, {self.param_key}, {self.param_key}, {self.param_key})
-                        """, (player_id, first_name, last_name, display_name, player_image, dob, height, weight, nat_id))
-
-                        position = team_player['position']
-                        if position:
-                            pos_id = position['id']
-                            pos_name = position['name']
-
-                            cursor.execute(f"""
-                                INSERT OR IGNORE INTO Positions (id, name)
-                                VALUES ({self.param_key}, {self.param_key})
-                            """, (pos_id, pos_name))
-                        else:
-                            pos_id = None
-
-                        jersey_number = team_player.get('jersey_number')
-
-                        is_captain = any(
-                            detail.get("type", {}).get("code") == "captain"
-                            for detail in team_player.get('details', None)
-                        )
-
-                        cursor.execute(f"""
-                        INSERT INTO PlayerTeamSeason (
-                            player_id, team_id, season_id, position_id, shirt_number, is_captain)
-                        VALUES ({self.param_key}, {self.param_key}, {self.param_key}, {self.param_key}, {self.param_key}, {self.param_key})
-                    """, (player_id, team_id, season_id, pos_id, jersey_number, is_captain))
-            print("\n")
-
-            self.conn.commit()
+    def get_player_features(self):
+        """
+        Rows for the player feature index, one per PlayerTeamSeason link in insertion order.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT P.id, P.date_of_birth, P.nationality_id, PS.team_id, PS.season_id,
+                       PS.position_id, PS.shirt_number, PS.is_captain, S.league_id
+                FROM Players P
+                INNER JOIN PlayerTeamSeason PS ON PS.player_id = P.id
+                INNER JOIN Seasons S ON S.id = PS.season_id
+                ORDER BY PS.id
+            """)
+            return cursor.fetchall()
 
     def get_players_for_translate(self):
         query = """
@@ -480,9 +1186,13 @@ class FootballDBHandler:
                    WHERE (p.display_name_he IS NULL OR p.display_name_he = '')
                    ORDER BY p.id,p.display_name
                """
-        df = pd.read_sql_query(query, self.conn)
+        # Offline only (translator), keep pandas out of the request path
+        import pandas as pd
+
+        with self.connection() as conn:
+            df = pd.read_sql_query(query, conn)
 
-        return df
+            return df
 
     def get_autocomplete_players(self, leagues_id=None, player_name=None):
         if self.db_type == 'sqlite':
@@ -510,25 +1220,65 @@ class FootballDBHandler:
                     """.format(placeholders)
             params.extend(leagues_id)
 
-        all_players = pd.read_sql_query(query, self.conn, params=params)
-        return all_players.to_dict(orient="records")
+        return self._fetch_all(query, params)
+
+    def search_players(self, query: str, limit: int = PLAYER_SEARCH_LIMIT):
+        """
+        Players whose Hebrew or Latin names contain ``query``, best matches first, as {"id", "name"} like
+        get_autocomplete_players.
+        """
+        query = " ".join(query.split())
+        if not query:
+            return []
+
+        if self.db_type == 'sqlite':
+            name = "CASE WHEN P.display_name GLOB '[A-Z]. *' THEN P.first_name_he || ' ' || P.last_name_he " \
+                   "ELSE P.display_name_he END"
+
+            if len(query) >= 3:
+                return self._fetch_all(f"""
+                    SELECT P.id, {name} AS name FROM PlayerSearch
+                    INNER JOIN Players P ON P.id = PlayerSearch.rowid
+                    WHERE PlayerSearch MATCH ? ORDER BY PlayerSearch.rank LIMIT ?
+                """, ('"' + query.replace('"', '""') + '"', limit))
+
+            # Trigrams need three characters, shorter queries match name prefixes
+            prefix = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            conditions = " OR ".join(f"P.{column} LIKE ? ESCAPE '\\'" for column in self.SEARCH_COLUMNS)
+            return self._fetch_all(f"SELECT P.id, {name} AS name FROM Players P WHERE {conditions} LIMIT ?",
+                                   (prefix,) * len(self.SEARCH_COLUMNS) + (limit,))
+
+        name = "CASE WHEN P.display_name ~ '^[A-Z].*' THEN P.first_name_he || ' ' || P.last_name_he " \
+               "ELSE P.display_name_he END"
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return self._fetch_all(f"""
+            SELECT P.id, {name} AS name FROM Players P
+            WHERE ({self.SEARCH_DOCUMENT}) ILIKE %s
+            ORDER BY similarity(({self.SEARCH_DOCUMENT}), %s) DESC, P.id
+            LIMIT %s
+        """, (pattern, query, limit))
 
     def get_player(self, player_id):
         query = f"""SELECT * FROM PLAYERS WHERE ID = {self.param_key}"""
-        player = pd.read_sql_query(query, self.conn, params=[player_id])
-        return player.iloc[0].to_dict()
+        return self._fetch_one(query, (player_id,))
 
     def update_player(self, player_id, first_name_he, last_name_he, display_name_he, nationality_id=None):
-        cursor = self.conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+
+            # Always update these fields
+            fields = [f"first_name_he = {self.param_key}", f"last_name_he = {self.param_key}", f"display_name_he = {self.param_key}"]
+            params = [first_name_he, last_name_he, display_name_he]
 
-        # Always update these fields
-        fields = [f"first_name_he = {self.param_key}", f"last_name_he = {self.param_key}", f"display_name_he = {self.param_key}"]
-        params = [first_name_he, last_name_he, display_name_he]
+            # Only add nationality_id if provided
+            nationality_changed = False
+            if nationality_id is not None:
+                cursor.execute(f"SELECT nationality_id FROM Players WHERE id = {self.param_key}", (player_id,))
+                row = cursor.fetchone()
+                nationality_changed = row is not None and row[0] != nationality_id
 
-        # Only add nationality_id if provided
-        if nationality_id is not None:
-            fields.append(f"nationality_id = {self.param_key}")
-            params.append(nationality_id)
+                fields.append(f"nationality_id = {self.param_key}")
+                params.append(nationality_id)
 
             # Add player_id for WHERE clause
             params.append(player_id)
@@ -541,33 +1291,84 @@ class FootballDBHandler:
             """
 
             cursor.execute(sql, params)
-            self.conn.commit()
+            conn.commit()
+
+            # Hebrew names are in the player catalogues, nationality is a similarity feature
+            self.bump_data_version("player_names")
+            if nationality_changed:
+                self.bump_data_version("roster")
+
+    def get_translated_players(self):
+        """
+        Players that already have Hebrew names, to seed the translation memo.
+        """
+        return self._fetch_all("""
+            SELECT first_name, last_name, first_name_he, last_name_he FROM Players
+            WHERE display_name_he IS NOT NULL AND display_name_he != ''
+        """)
+
+    def get_translation_memo(self):
+        """
+        The translation memo as {kind: {source: hebrew}}.
+        """
+        memo = {"full": {}, "token": {}}
+        for row in self._fetch_all("SELECT kind, source, hebrew FROM TranslationMemo"):
+            memo.setdefault(row["kind"], {})[row["source"]] = row["hebrew"]
+
+        return memo
+
+    def save_translation_memo(self, entries):
+        """
+        Add (kind, source, hebrew) entries, keeping existing translations.
+        """
+        with self.connection() as conn:
+            self._insert_ignore(conn.cursor(), "TranslationMemo", ("kind", "source", "hebrew"), entries)
+            conn.commit()
+
+    def update_players_he(self, updates):
+        """
+        Store Hebrew names for many players in one transaction.
+        ``updates`` holds (player_id, first_name_he, last_name_he, display_name_he) tuples.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            rows = [(first_he, last_he, display_he, player_id) for player_id, first_he, last_he, display_he in updates]
+            sql = f"""
+                UPDATE Players SET first_name_he = {self.param_key}, last_name_he = {self.param_key},
+                                   display_name_he = {self.param_key}
+                WHERE id = {self.param_key}
+            """
+
+            if self.db_type == "postgresql":
+                execute_batch(cursor, sql, rows, page_size=500)
+            else:
+                cursor.executemany(sql, rows)
+            conn.commit()
+
+            self.bump_data_version("player_names")
 
     def get_customer_game(self, game_number: Optional[int]):
+        """
+        The columns of an active game's /api/game body: the ranking is in GameRanks, the players in PlayerLists.
+        """
         now = datetime.utcnow()
 
         if game_number:
             query = f"""
-                SELECT g.id, g.created_at, g.activate_at, g.distance, g.max_rank, g.hint, g.players, g.game_number,
+                SELECT g.id, g.max_rank, g.hint, g.players_hash, g.game_number,
                 (SELECT MAX(game_number) FROM Games WHERE activate_at <= {self.param_key}) AS max_game_number 
                 FROM Games g WHERE g.game_number = {self.param_key} and g.activate_at <= {self.param_key} ORDER BY g.activate_at DESC LIMIT 1  
             """
-            game = pd.read_sql_query(query, self.conn, params=[now, game_number, now])
-        else:
-            query = f"""
-                SELECT id, created_at, activate_at, distance, max_rank, hint, players, 
-                       game_number, game_number AS max_game_number
-                FROM Games
-                WHERE activate_at <= {self.param_key}
-                ORDER BY activate_at DESC
-                LIMIT 1
-            """
-            game = pd.read_sql_query(query, self.conn, params=[now])
-
-        if not game.empty:
-            return game.iloc[0].to_dict()
+            return self._fetch_one(query, (now, game_number, now))
 
-        return None
+        query = f"""
+            SELECT id, max_rank, hint, players_hash, game_number, game_number AS max_game_number
+            FROM Games
+            WHERE activate_at <= {self.param_key}
+            ORDER BY activate_at DESC
+            LIMIT 1
+        """
+        return self._fetch_one(query, (now,))
 
     def search_game(self, date: Optional[str], player_name: Optional[str], game_number: Optional[str]):
         params = []
@@ -603,8 +1404,7 @@ class FootballDBHandler:
 
         query += " ORDER BY activate_at DESC"
 
-        games = pd.read_sql_query(query, self.conn, params=params)
-        return games.to_dict(orient="records")
+        return self._fetch_all(query, params)
 
     def get_game(self, game_id: Optional[int]):
         if self.db_type == 'sqlite':
@@ -616,85 +1416,199 @@ class FootballDBHandler:
             SELECT g.id, g.activate_at, g.hint, g.leagues, p.display_name_he as player_name, p.id as player_id FROM Games as g
             INNER JOIN Players AS p ON p.id = {JSON_Q} WHERE g.id = {self.param_key}
         """
-        game = pd.read_sql_query(query, self.conn, params=[game_id])
-
-        if not game.empty:
-            game_details = game.iloc[0].to_dict()
+        with self.connection() as conn:
+            game_details = self._fetch_one(query, (game_id,))
 
-            leagues = str(game_details['leagues']).replace('[', '').replace(']', '').split(',')
+            if game_details:
+                leagues = str(game_details['leagues']).replace('[', '').replace(']', '').split(',')
 
-            placeholders = ",".join([self.param_key] * len(leagues))
-            leagues = pd.read_sql_query("SELECT id, name FROM Leagues WHERE ID IN ({})".format(placeholders), self.conn,
-                                        params=leagues)
+                placeholders = ",".join([self.param_key] * len(leagues))
+                leagues = self._fetch_all("SELECT id, name FROM Leagues WHERE ID IN ({})".format(placeholders), leagues)
 
-            del game_details['leagues']
+                del game_details['leagues']
 
-            return {'game': game_details, 'leagues': leagues.to_dict(orient="records")}
+                return {'game': game_details, 'leagues': leagues}
 
-        return None
-
-    def create_game(self, activate_at: str, distance, hint: str, leagues):
-        cursor = self.conn.cursor()
+            return None
 
+    def _insert_game(self, cursor, activate_at, distance, hint: str, leagues, players: str):
         max_rank = max(item["rank"] for item in distance)
 
-        players_search = self.get_autocomplete_players(leagues_id=leagues)
-
         cursor.execute(f"""
-            INSERT INTO Games (activate_at, distance, max_rank, hint, leagues, players)
+            INSERT INTO Games (activate_at, distance, max_rank, hint, leagues, players_hash)
             VALUES ({self.param_key}, {self.param_key}, {self.param_key}, {self.param_key}, {self.param_key}, {self.param_key})
+            RETURNING id
             """, (activate_at, json.dumps(distance), max_rank, hint, json.dumps(leagues, ensure_ascii=False),
-                  json.dumps(players_search, ensure_ascii=False)))
-        self.conn.commit()
+                  self._store_player_list(cursor, players)))
+        game_id = cursor.fetchone()[0]
+
+        self._insert_game_ranks(cursor, game_id, distance)
+
+    def create_game(self, activate_at: str, distance, hint: str, leagues, players: str):
+        """
+        ``players`` is the leagues' autocomplete list as JSON, see PlayerCatalogue.
+        Returns the (old, new) game numbers that moved.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
 
-        self.__update_games_number()
+            self._insert_game(cursor, activate_at, distance, hint, leagues, players)
+            moves = self.__update_games_number(cursor)
+            conn.commit()
 
-    def update_game(self, game_id: int, activate_at, distance, hint: str, leagues):
-        cursor = self.conn.cursor()
+            return moves
 
-        max_rank = max(item["rank"] for item in distance)
+    def create_games(self, games):
+        """
+        Insert several games in a single transaction and renumber once at the end.
+        Each game is a dict with activate_at, distance, hint, leagues and players (JSON, see PlayerCatalogue).
+        Returns the (old, new) game numbers that moved.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+
+            try:
+                for game in games:
+                    self._insert_game(cursor, game["activate_at"], game["distance"], game["hint"], game["leagues"],
+                                      game["players"])
+                moves = self.__update_games_number(cursor)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+            return moves
+
+    def update_game(self, game_id: int, activate_at, distance, hint: str, leagues, players: str):
+        """
+        Returns the game's previous number and the (old, new) game numbers that moved.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
 
-        players_search = self.get_autocomplete_players(leagues_id=leagues)
+            max_rank = max(item["rank"] for item in distance)
 
-        query = f""" UPDATE Games SET activate_at = {self.param_key}, distance = {self.param_key} , 
-        max_rank = {self.param_key}, hint = {self.param_key}, leagues  = {self.param_key} , 
-        players = {self.param_key} WHERE id = {self.param_key} RETURNING game_number"""
+            query = f""" UPDATE Games SET activate_at = {self.param_key}, distance = {self.param_key} , 
+            max_rank = {self.param_key}, hint = {self.param_key}, leagues  = {self.param_key} , 
+            players_hash = {self.param_key} WHERE id = {self.param_key} RETURNING game_number"""
 
-        cursor.execute(query, (activate_at, json.dumps(distance), max_rank, hint, json.dumps(leagues, ensure_ascii=False),
-                               json.dumps(players_search, ensure_ascii=False), game_id))
-        old_game_number = cursor.fetchone()[0]
-        self.conn.commit()
+            cursor.execute(query, (activate_at, json.dumps(distance), max_rank, hint, json.dumps(leagues, ensure_ascii=False),
+                                   self._store_player_list(cursor, players), game_id))
+            old_game_number = cursor.fetchone()[0]
 
-        self.__update_games_number()
+            cursor.execute(f"DELETE FROM GameRanks WHERE game_id = {self.param_key}", (game_id,))
+            self._insert_game_ranks(cursor, game_id, distance)
+            moves = self.__update_games_number(cursor)
+            conn.commit()
+
+            return old_game_number, moves
+
+    def get_game_ranking(self, game_number: int):
+        """
+        The full ranking (list of {"id", "rank"}, ordered by player id) of an active game, or None.
+        """
+        now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT r.player_id, r.rank FROM Games g
+                LEFT JOIN GameRanks r ON r.game_id = g.id
+                WHERE g.game_number = {self.param_key} AND g.activate_at < {self.param_key}
+                ORDER BY r.player_id
+            """, (game_number, now))
+            rows = cursor.fetchall()
 
-        return old_game_number
+            if not rows:
+                return None
+
+            return [{"id": player_id, "rank": rank} for player_id, rank in rows if player_id is not None]
 
     def get_player_rank(self, game_number: int, player_id: int) -> int | None:
+        """
+        A player's rank in an active game, an indexed point query on GameRanks. None when the game isn't active or the
+        player isn't ranked.
+        """
         now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-        query = f"SELECT distance FROM Games WHERE game_number = {self.param_key} AND activate_at < {self.param_key}"
-        df_game = pd.read_sql_query(query, self.conn, params=[game_number, now])
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT r.rank FROM Games g
+                INNER JOIN GameRanks r ON r.game_id = g.id AND r.player_id = {self.param_key}
+                WHERE g.game_number = {self.param_key} AND g.activate_at < {self.param_key}
+            """, (player_id, game_number, now))
+            row = cursor.fetchone()
 
-        if df_game.empty:
-            return None
+            return row[0] if row else None
 
-        try:
-            raw_df = df_game.loc[0, "distance"] if type(df_game.loc[0, "distance"]) == list else json.loads(df_game.loc[0, "distance"])
-            df_distance = pd.DataFrame(raw_df)
-            result = df_distance.loc[df_distance["id"] == player_id, "rank"]
-            if not result.empty:
-                return int(result.iloc[0])
-        except Exception:
-            return None
+    def create_job(self, kind: str, payload, owner: Optional[str] = None) -> int:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                INSERT INTO Jobs (kind, status, payload, owner, heartbeat_at)
+                VALUES ({self.param_key}, 'queued', {self.param_key}, {self.param_key}, {self.param_key}) RETURNING id
+            """, (kind, json.dumps(payload, ensure_ascii=False), owner, datetime.utcnow()))
+            job_id = cursor.fetchone()[0]
+            conn.commit()
 
-        return None
+            return job_id
+
+    def update_job(self, job_id: int, status: str, result=None, error: Optional[str] = None):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                UPDATE Jobs SET status = {self.param_key}, result = {self.param_key}, error = {self.param_key},
+                                updated_at = CURRENT_TIMESTAMP
+                WHERE id = {self.param_key}
+            """, (status, json.dumps(result, ensure_ascii=False), error, job_id))
+            conn.commit()
+
+    def heartbeat_jobs(self, owner: str):
+        """Mark the queued and running jobs of ``owner`` as still alive."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                UPDATE Jobs SET heartbeat_at = {self.param_key}
+                WHERE owner = {self.param_key} AND status IN ('queued', 'running')
+            """, (datetime.utcnow(), owner))
+            conn.commit()
+
+    def fail_stale_jobs(self, stale_before: datetime) -> int:
+        """
+        Fail the queued and running jobs whose worker stopped heartbeating before ``stale_before``: it was restarted,
+        killed or redeployed, and nothing is running them anymore. Returns how many were failed.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                UPDATE Jobs SET status = 'failed', error = 'worker restarted', updated_at = CURRENT_TIMESTAMP
+                WHERE status IN ('queued', 'running') AND (heartbeat_at IS NULL OR heartbeat_at < {self.param_key})
+            """, (stale_before,))
+            failed = cursor.rowcount
+            conn.commit()
+
+            return failed
+
+    def get_job(self, job_id: int):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT id, kind, status, result, error, created_at, updated_at FROM Jobs WHERE id = {self.param_key}
+            """, (job_id,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+
+            job = dict(zip([column[0] for column in cursor.description], row))
+            if isinstance(job["result"], str):
+                job["result"] = json.loads(job["result"])
+
+            return job
 
     def get_leagues(self):
-        leagues = pd.read_sql_query("SELECT ID, NAME FROM LEAGUES ORDER BY NAME", self.conn)
-        return leagues.to_dict(orient="records")
+        return self._fetch_all("SELECT ID, NAME FROM LEAGUES ORDER BY NAME")
 
     def get_countries(self):
-        countries = pd.read_sql_query("SELECT ID, NAME FROM COUNTRIES ORDER BY NAME", self.conn)
-        return countries.to_dict(orient="records")
+        return self._fetch_all("SELECT ID, NAME FROM COUNTRIES ORDER BY NAME")
 
     def get_countdown(self):
         now = datetime.utcnow()
@@ -712,17 +1626,17 @@ class FootballDBHandler:
             ORDER BY game_number ASC
             LIMIT 1
             """
-        next_game = pd.read_sql_query(query, self.conn, params=[now])
+        next_game = self._fetch_one(query, (now,))
 
-        if not next_game.empty:
-            return str(next_game.iloc[0].to_dict()['activate_at'])
+        if next_game:
+            return str(next_game['activate_at'])
 
         return None
 
     def close(self):
-        if hasattr(self, 'conn') and self.conn:
+        if getattr(self, 'engine', None) is not None:
             try:
-                self.conn.close()
+                self.engine.dispose()
             except Exception:
                 pass
         # Reset singleton state
@@ -0,0 +1,85 @@
+import os
+import shutil
+import threading
+
+from game.similarity import PlayerFeatures
+
+
+class FeatureIndex:
+    """
+    Player feature index persisted on disk and shared by game creations.
+
+    Every build is tagged with the "roster" data version. Ingestion and nationality updates bump that version,
+    so the next ``load`` rebuilds the index once; otherwise the saved arrays are memory-mapped and no SQL runs.
+    Per league-set views (with their inverted indexes) are kept for the lifetime of a version.
+    """
+
+    VERSION_NAME = "roster"
+    MAX_LEAGUE_SETS = 32
+
+    def __init__(self, db_handler, path: str):
+        self.db = db_handler
+        self.path = path
+        self._lock = threading.Lock()
+        self._version = None
+        self._features = None
+        self._league_sets = {}
+
+    def _version_path(self, version: int) -> str:
+        return os.path.join(self.path, f"{self.VERSION_NAME}-{version}")
+
+    def current_path(self) -> str:
+        """Directory of the up to date index, building it first if needed."""
+        self.load()
+        return self._version_path(self._version)
+
+    def load(self, leagues_id=None) -> PlayerFeatures:
+        version = self.db.get_data_version(self.VERSION_NAME)
+
+        with self._lock:
+            if self._features is None or self._version != version:
+                version_path = self._version_path(version)
+                if not os.path.isdir(version_path):
+                    self.build(version)
+
+                self._features = PlayerFeatures.load(version_path)
+                self._version = version
+                self._league_sets = {}
+
+            if not leagues_id:
+                return self._features
+
+            key = tuple(sorted({int(league_id) for league_id in leagues_id}))
+            features = self._league_sets.get(key)
+            if features is None:
+                if len(self._league_sets) >= self.MAX_LEAGUE_SETS:
+                    self._league_sets.pop(next(iter(self._league_sets)))
+                features = self._league_sets[key] = self._features.for_leagues(key)
+
+            return features
+
+    def build(self, version: int = None):
+        if version is None:
+            version = self.db.get_data_version(self.VERSION_NAME)
+
+        rows = self.db.get_player_features()
+        # Players in order of their first link row, the order ties have always been ranked in
+        player_ids = list(dict.fromkeys(row[0] for row in rows))
+        features = PlayerFeatures.from_rows(player_ids, rows)
+
+        version_path = self._version_path(version)
+        tmp_path = f"{version_path}.{os.getpid()}.tmp"
+        features.save(tmp_path)
+        try:
+            os.rename(tmp_path, version_path)
+        except OSError:
+            # Another worker already published this version
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        # Mapped files stay readable for processes still using an old version
+        for name in os.listdir(self.path):
+            if name.startswith(f"{self.VERSION_NAME}-") and name != os.path.basename(version_path) \
+                    and not name.endswith(".tmp"):
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+        print(f"Feature index {self.VERSION_NAME}-{version}: {len(features)} players, {len(features.row_player)} rows")
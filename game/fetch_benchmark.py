@@ -0,0 +1,122 @@
+"""
+Per-call latency of FootballDBHandler._fetch_all / _fetch_one against the pandas read_sql_query path they replaced,
+on a generated SQLite database of the given size.
+
+    python -m game.fetch_benchmark [--players 5000] [--games 200] [--number 500]
+
+The database is created in a temporary directory, the working directory is left untouched.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import timeit
+import warnings
+from datetime import datetime, timedelta
+
+
+def create_fixture(db, players: int, games: int, seed: int = 1):
+    """Leagues, countries, players and games (half of them active) shaped like the real data."""
+    rnd = random.Random(seed)
+    player_ids = rnd.sample(range(1000, 1_000_000), players)
+    leagues = [8, 82, 301, 372, 375]
+
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany("INSERT INTO Leagues (id, name) VALUES (?, ?)", [(id, f"League {id}") for id in leagues])
+        cursor.executemany("INSERT INTO Countries (id, name) VALUES (?, ?)", [(id, f"Country {id}") for id in range(1, 60)])
+        cursor.executemany("INSERT INTO Players (id, first_name, last_name, display_name, display_name_he, date_of_birth, "
+                           "nationality_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           [(id, f"First{id % 97}", f"Last{id}", f"F. Last{id}", f"שחקן {id}",
+                             f"{rnd.randint(1980, 2004)}-0{rnd.randint(1, 9)}-1{rnd.randint(0, 9)}", rnd.randint(1, 59))
+                            for id in player_ids])
+        conn.commit()
+
+    first = datetime.utcnow() - timedelta(days=games // 2)
+    players_json = json.dumps([{"id": id, "name": f"F. Last{id}"} for id in player_ids], ensure_ascii=False)
+    db.create_games([{
+        "activate_at": (first + timedelta(days=day)).strftime("%Y-%m-%d %H:%M:%S"),
+        "distance": [{"id": id, "rank": rank} for rank, id in enumerate(rnd.sample(player_ids, len(player_ids)), 1)],
+        "hint": f"Hint {day}",
+        "leagues": rnd.sample(leagues, 2),
+        "players": players_json,
+    } for day in range(games)])
+
+    return player_ids
+
+
+def benchmark_queries(db, player_ids):
+    """(name, query, params, single row) of request-path queries."""
+    key = db.param_key
+    now = datetime.utcnow()
+    return [
+        ("player", f"SELECT * FROM Players WHERE id = {key}", (player_ids[0],), True),
+        ("customer game", f"""
+            SELECT id, max_rank, hint, players_hash, game_number, game_number AS max_game_number
+            FROM Games WHERE activate_at <= {key} ORDER BY activate_at DESC LIMIT 1
+         """, (now,), True),
+        ("countdown", f"""
+            SELECT activate_at FROM Games WHERE game_number > (
+                SELECT game_number FROM Games WHERE activate_at < {key} ORDER BY game_number DESC LIMIT 1
+            ) ORDER BY game_number ASC LIMIT 1
+         """, (now,), True),
+        ("leagues", "SELECT ID, NAME FROM LEAGUES ORDER BY NAME", (), False),
+        ("countries", "SELECT ID, NAME FROM COUNTRIES ORDER BY NAME", (), False),
+        ("games", "SELECT id, activate_at, hint, game_number FROM Games ORDER BY activate_at DESC", (), False),
+        ("game ranking", f"SELECT player_id, rank FROM GameRanks WHERE game_id = {key} ORDER BY rank LIMIT 100",
+         (1,), False),
+    ]
+
+
+def read_sql(db, query: str, params, one: bool):
+    """The pandas path the request handlers used before _fetch_all / _fetch_one."""
+    import pandas as pd
+
+    with db.connection() as conn:
+        frame = pd.read_sql_query(query, conn, params=list(params))
+        if one:
+            return frame.iloc[0].to_dict() if len(frame) else None
+        return frame.to_dict("records")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-call latency of _fetch_all / _fetch_one vs pandas")
+    parser.add_argument("--players", type=int, default=5000)
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--number", type=int, default=500, help="Calls per timing run (best of 3 runs)")
+    args = parser.parse_args()
+
+    # pandas warns on DBAPI connections other than sqlite3's own
+    warnings.simplefilter("ignore", UserWarning)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        # The SQLite file is DB_FILE_NAME in the working directory
+        os.chdir(directory)
+        try:
+            import common
+            common.DEFAULT_DB_TYPE = "sqlite"  # read when game.db is imported
+            from game.db import FootballDBHandler
+
+            db = FootballDBHandler()
+            player_ids = create_fixture(db, args.players, args.games)
+
+            print(f"{args.players} players, {args.games} games, best of 3 x {args.number} calls")
+            print(f"{'query':16s} {'pandas':>10s} {'fetch':>10s}")
+            for name, query, params, one in benchmark_queries(db, player_ids):
+                fetch = db._fetch_one if one else db._fetch_all
+                assert read_sql(db, query, params, one) is not None and fetch(query, params) is not None, name
+
+                timings = []
+                for call in (lambda: read_sql(db, query, params, one), lambda: fetch(query, params)):
+                    timings.append(min(timeit.repeat(call, number=args.number, repeat=3)) / args.number * 1e6)
+                print(f"{name:16s} {timings[0]:8.1f}µs {timings[1]:8.1f}µs  x{timings[0] / timings[1]:.1f}")
+
+            db.close()
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from common import JOB_HEARTBEAT_SECONDS, JOB_STALE_SECONDS
+
+
+class JobQueue:
+    """
+    Runs slow admin work (game ranking and persistence) off the request path.
+
+    Jobs execute on a small thread pool inside the worker that accepted them. Their status lives in the Jobs table,
+    so any worker can answer /api/admin/jobs/{id}.
+
+    A job dies with its worker (restart, timeout kill, redeploy). Each worker heartbeats the jobs it owns, and a
+    queued or running job whose heartbeat is older than ``stale_after`` is reported as failed.
+    """
+
+    def __init__(self, db_handler, max_workers: int, heartbeat: timedelta = timedelta(seconds=JOB_HEARTBEAT_SECONDS),
+                 stale_after: timedelta = timedelta(seconds=JOB_STALE_SECONDS)):
+        self.db = db_handler
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="jobs")
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.heartbeat = heartbeat
+        self.stale_after = stale_after
+
+        self._active = 0
+        self._lock = threading.Lock()
+
+        failed = self.fail_stale_jobs()
+        if failed:
+            print(f"Failed {failed} jobs left behind by stopped workers")
+
+        threading.Thread(target=self._heartbeat, name="jobs-heartbeat", daemon=True).start()
+
+    def submit(self, kind: str, payload, func) -> int:
+        job_id = self.db.create_job(kind, payload, self.owner)
+        with self._lock:
+            self._active += 1
+        self.executor.submit(self._run, job_id, func)
+
+        return job_id
+
+    def _run(self, job_id: int, func):
+        try:
+            self.db.update_job(job_id, "running")
+            self.db.update_job(job_id, "done", result=func())
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self.db.update_job(job_id, "failed", error=str(e))
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(self.heartbeat.total_seconds())
+            if not self._active:
+                continue
+
+            try:
+                self.db.heartbeat_jobs(self.owner)
+            except Exception as e:
+                print(f"Job heartbeat failed: {e}")
+
+    def fail_stale_jobs(self) -> int:
+        return self.db.fail_stale_jobs(datetime.utcnow() - self.stale_after)
+
+    def get(self, job_id: int):
+        self.fail_stale_jobs()
+        return self.db.get_job(job_id)
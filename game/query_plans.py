@@ -0,0 +1,27 @@
+"""
+Checks that the hot queries are served by indexes, see FootballDBHandler.check_query_plans.
+
+    python -m game.query_plans
+
+Exits with status 1 when a plan reads a whole table.
+"""
+import sys
+
+
+def main():
+    from game.db import FootballDBHandler
+
+    failed = 0
+    for name, (uses_indexes, plan) in FootballDBHandler().check_query_plans().items():
+        print(f"{'✅' if uses_indexes else '❌'} {name}")
+        for line in plan:
+            print(f"    {line}")
+        failed += not uses_indexes
+
+    if failed:
+        print(f"{failed} queries read a whole table")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
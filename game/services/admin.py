@@ -1,10 +1,14 @@
-from typing import Optional
+from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from starlette import status
 
-from game.config import auth, game_service
+from common import PLAYER_SEARCH_LIMIT
+from game.batch import schedule_games
+from game.config import auth, game_service, feature_index, job_queue, async_db, player_catalogue
 from game.db import FootballDBHandler
 from game.services.models import PlayerUpdateRequest, CreateGameRequest
 from utils import calculate_all_distances_fixed, parse_datetime
@@ -27,7 +31,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
 @router.get("/leagues")
 async def get_leagues(user: str = Depends(auth)):
     try:
-        return FootballDBHandler().get_leagues()
+        return await async_db.get_leagues()
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -35,15 +39,15 @@ async def get_leagues(user: str = Depends(auth)):
 @router.get("/countries")
 async def get_countries(user: str = Depends(auth)):
     try:
-        return FootballDBHandler().get_countries()
+        return await async_db.get_countries()
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 
 @router.get("/players")
-async def search_players(query: str, user: str = Depends(auth)):
+async def search_players(query: str, limit: int = PLAYER_SEARCH_LIMIT, user: str = Depends(auth)):
     try:
-        return FootballDBHandler().get_autocomplete_players(player_name=query)
+        return await async_db.search_players(query, limit)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -51,8 +55,8 @@ async def search_players(query: str, user: str = Depends(auth)):
 @router.get("/players-by-leagues")
 async def get_players_by_leagues(leagues_id: Optional[str]):
     try:
-        leagues_id = leagues_id.split(',')
-        return FootballDBHandler().get_autocomplete_players(leagues_id)
+        leagues_id = [league_id for league_id in leagues_id.split(',') if league_id]
+        return Response(content=await async_db.run(player_catalogue.get, leagues_id), media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -60,7 +64,7 @@ async def get_players_by_leagues(leagues_id: Optional[str]):
 @router.get("/players/{player_id}")
 async def get_player(player_id: int, user: str = Depends(auth)):
     try:
-        return FootballDBHandler().get_player(player_id)
+        return await async_db.get_player(player_id)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -68,8 +72,8 @@ async def get_player(player_id: int, user: str = Depends(auth)):
 @router.post("/players/{player_id}")
 async def get_player(player_id: int, request: PlayerUpdateRequest, user: str = Depends(auth)):
     try:
-        return FootballDBHandler().update_player(player_id, request.first_name_he, request.last_name_he, request.display_name_he,
-                                                 request.nationality_id)
+        return await async_db.update_player(player_id, request.first_name_he, request.last_name_he, request.display_name_he,
+                                            request.nationality_id)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -78,24 +82,72 @@ async def get_player(player_id: int, request: PlayerUpdateRequest, user: str = D
 async def search_game(game_date: Optional[str] = None, player_name: Optional[str] = None, game_number: Optional[str] = None,
                       user: str = Depends(auth)):
     try:
-        db_handler = FootballDBHandler()
-        return db_handler.search_game(game_date, player_name, game_number)
+        return await async_db.search_game(game_date, player_name, game_number)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 
+def _accepted(job_id: int):
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"job_id": job_id},
+                        headers={"Location": f"{router.prefix}/jobs/{job_id}"})
+
+
 @router.post("/games")
 async def create_game(request: CreateGameRequest, user: str = Depends(auth)):
     try:
         if request.player_id:
-            # Calculate player
-            results = calculate_all_distances_fixed(request.player_id, request.leagues)
+            def _create():
+                # Calculate player
+                results = calculate_all_distances_fixed(request.player_id, request.leagues)
 
-            db_handler = FootballDBHandler()
-            db_handler.create_game(activate_at=parse_datetime(request.activate_at), distance=results, hint=request.hint,
-                                   leagues=request.leagues)
+                db_handler = FootballDBHandler()
+                moves = db_handler.create_game(activate_at=parse_datetime(request.activate_at), distance=results,
+                                               hint=request.hint, leagues=request.leagues,
+                                               players=player_catalogue.get(request.leagues))
+
+                game_service.revoke_moved_games(moves)
+                return {"moved": moves}
+
+            return _accepted(await async_db.run(job_queue.submit, "create_game", jsonable_encoder(request), _create))
+
+        return Response(status_code=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@router.post("/games/batch")
+async def create_games(requests: List[CreateGameRequest], user: str = Depends(auth)):
+    try:
+        def _create():
+            games = [{"player_id": request.player_id, "leagues": request.leagues,
+                      "activate_at": parse_datetime(request.activate_at), "hint": request.hint}
+                     for request in requests if request.player_id]
+            moves = schedule_games(FootballDBHandler(), feature_index, player_catalogue, games)
 
-            return Response(status_code=status.HTTP_200_OK)
+            game_service.revoke_moved_games(moves)
+            return {"created": len(games), "moved": moves}
+
+        return _accepted(await async_db.run(job_queue.submit, "create_games", jsonable_encoder(requests), _create))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@router.get("/cache/stats")
+async def get_cache_stats(user: str = Depends(auth)):
+    return {**await async_db.run(game_service.stats), "player_catalogue": player_catalogue.stats()}
+
+
+@router.get("/db/stats")
+async def get_db_stats(user: str = Depends(auth)):
+    return await async_db.pool_stats()
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: int, user: str = Depends(auth)):
+    try:
+        job = await async_db.run(job_queue.get, job_id)
+        if job:
+            return job
 
         return Response(status_code=status.HTTP_404_NOT_FOUND)
     except Exception as e:
@@ -105,8 +157,7 @@ async def create_game(request: CreateGameRequest, user: str = Depends(auth)):
 @router.get("/games/{game_id}")
 async def get_game(game_id: int, user: str = Depends(auth)):
     try:
-        db_handler = FootballDBHandler()
-        result = db_handler.get_game(game_id)
+        result = await async_db.get_game(game_id)
         if result:
             return result
 
@@ -118,17 +169,23 @@ async def get_game(game_id: int, user: str = Depends(auth)):
 @router.put("/games/{game_id}")
 async def update_game(game_id: int, request: CreateGameRequest, user: str = Depends(auth)):
     try:
-        results = calculate_all_distances_fixed(request.player_id, request.leagues)
+        def _update():
+            results = calculate_all_distances_fixed(request.player_id, request.leagues)
+
+            db_handler = FootballDBHandler()
+            old_game_number, moves = \
+                db_handler.update_game(game_id=game_id, activate_at=parse_datetime(request.activate_at), distance=results,
+                                       hint=request.hint, leagues=request.leagues,
+                                       players=player_catalogue.get(request.leagues))
 
-        db_handler = FootballDBHandler()
-        old_game_number = \
-            db_handler.update_game(game_id=game_id, activate_at=parse_datetime(request.activate_at), distance=results, hint=request.hint,
-                                   leagues=request.leagues)
+            print("Revoking game number: ", old_game_number, moves)
+            game_service.revoke_game(game_id=old_game_number)
+            game_service.revoke_ranks_for_game(game_id=old_game_number)
+            game_service.revoke_moved_games(moves)
 
-        print("Revoking game number: ", old_game_number)
-        game_service.revoke_game(game_id=old_game_number)
-        game_service.revoke_ranks_for_game(game_id=old_game_number)
+            return {"game_number": old_game_number, "moved": moves}
 
-        return Response(status_code=status.HTTP_200_OK)
+        payload = {"game_id": game_id, **jsonable_encoder(request)}
+        return _accepted(await async_db.run(job_queue.submit, "update_game", payload, _update))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
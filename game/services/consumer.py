@@ -1,36 +1,48 @@
-import json
+import re
 from typing import Optional
 
 from fastapi import APIRouter, Request, Response, HTTPException
 from starlette import status
 
-from game.config import game_service
-from game.db import FootballDBHandler
+from game.cache import MISSING
+from game.config import game_service, async_db
 from game.limiter import limiter
 from game.services.models import GameRequest
 
 router = APIRouter(prefix="/api")
 
+ENTITY_TAG = re.compile(r'(?:W/)?"[^"]*"')
+
+
+def _none_match(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches ``etag``: "*" or a list of entity tags, compared weakly (RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    return any(tag.removeprefix("W/") == etag for tag in ENTITY_TAG.findall(if_none_match))
+
 
 @router.get("/game")
-async def get_customer_game(game_number: Optional[int] = None):
+async def get_customer_game(request: Request, game_number: Optional[int] = None):
     try:
-        game = game_service.get_game_by_row_number(game_number)
-        try:
-            players = json.loads(game["players"])
-        except:
-            players = game["players"]
-
-        if game:
-            return {
-                "max_rank": game["max_rank"],
-                "hint": game["hint"],
-                "players": players,
-                "game_number": game["game_number"],
-                "max_game_number": game["max_game_number"]
-            }
+        # Cache hits are answered on the event loop, only misses wait for a DB thread
+        game = game_service.peek_game_response(game_number) or \
+            await async_db.run(game_service.get_game_response, game_number)
+        if not game:
+            return Response(status_code=status.HTTP_404_NOT_FOUND)
 
-        return Response(status_code=status.HTTP_404_NOT_FOUND)
+        gzipped = bool(game.gzip_body) and "gzip" in request.headers.get("accept-encoding", "")
+        headers = {"ETag": game.gzip_etag if gzipped else game.etag, "Vary": "Accept-Encoding"}
+        if _none_match(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        if gzipped:
+            return Response(content=game.gzip_body, media_type="application/json",
+                            headers={**headers, "Content-Encoding": "gzip"})
+
+        return Response(content=game.body, media_type="application/json", headers=headers)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -40,7 +52,9 @@ async def get_customer_game(game_number: Optional[int] = None):
 async def check_response(request: Request, body: GameRequest):
     try:
         if body.game_number and body.player_id:
-            rank = game_service.get_rank(body.game_number, body.player_id)
+            rank = game_service.peek_rank(body.game_number, body.player_id)
+            if rank is MISSING:
+                rank = await async_db.run(game_service.get_rank, body.game_number, body.player_id)
             if rank:
                 return rank
 
@@ -51,4 +65,4 @@ async def check_response(request: Request, body: GameRequest):
 
 @router.get("/next-game")
 async def get_next_game_start_date(response: Response):
-    return Response(content=FootballDBHandler().get_countdown(), headers={"Cache-Control": "public, max-age=30"})
+    return Response(content=await async_db.get_countdown(), headers={"Cache-Control": "public, max-age=30"})
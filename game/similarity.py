@@ -0,0 +1,234 @@
+import os
+
+import numpy as np
+
+
+class InvertedIndex:
+    """Posting lists from a feature value to the rows holding it, stored as sorted keys plus CSR offsets."""
+
+    def __init__(self, values, rows):
+        order = np.argsort(values[rows], kind="stable")
+        self.rows = rows[order]
+        self.keys, starts = np.unique(values[self.rows], return_index=True)
+        self.offsets = np.append(starts, len(self.rows))
+
+    def lookup(self, values):
+        """Rows holding any of ``values``."""
+        values = np.unique(values)
+        positions = np.searchsorted(self.keys, values)
+        positions = positions[positions < len(self.keys)]
+        positions = positions[np.isin(self.keys[positions], values)]
+        if not len(positions):
+            return np.empty(0, dtype=np.int64)
+
+        return np.concatenate([self.rows[self.offsets[position]:self.offsets[position + 1]] for position in positions])
+
+
+class PlayerFeatures:
+    """
+    Integer-encoded player profiles.
+
+    Row arrays hold one entry per PlayerTeamSeason row (``row_player`` is the index of the row's player in
+    ``player_ids``), player arrays hold one entry per player. Missing position / shirt values are encoded as -1,
+    a missing nationality as 0 and an unparsable birth year is masked out by ``has_birth_year``.
+    """
+
+    ARRAYS = ("player_ids", "row_player", "team", "season", "league", "position", "shirt", "captain", "nationality",
+              "birth_year", "has_birth_year")
+
+    def __init__(self, player_ids, row_player, team, season, league, position, shirt, captain, nationality,
+                 birth_year, has_birth_year):
+        self.player_ids = player_ids
+        self.row_player = row_player
+        self.team = team
+        self.season = season
+        self.league = league
+        self.position = position
+        self.shirt = shirt
+        self.captain = captain
+        self.nationality = nationality
+        self.birth_year = birth_year
+        self.has_birth_year = has_birth_year
+
+        self.player_index = {pid: index for index, pid in enumerate(player_ids.tolist())}
+        self.team_season = team * (int(season.max(initial=0)) + 1) + season
+        self.captains = np.bincount(row_player[captain], minlength=len(player_ids)) > 0
+
+        self._postings = None
+
+    @property
+    def postings(self):
+        """Inverted indexes over (team, season), team, league, position, shirt and player, built on first use."""
+        if self._postings is None:
+            all_rows = np.arange(len(self.row_player))
+            self._postings = {
+                "team_season": InvertedIndex(self.team_season, all_rows),
+                "team": InvertedIndex(self.team, all_rows),
+                "league": InvertedIndex(self.league, all_rows),
+                "position": InvertedIndex(self.position, np.flatnonzero(self.position >= 0)),
+                "shirt": InvertedIndex(self.shirt, np.flatnonzero(self.shirt >= 0)),
+                "player": InvertedIndex(self.row_player, all_rows),
+            }
+
+        return self._postings
+
+    @classmethod
+    def from_rows(cls, player_ids, rows):
+        """
+        Build the arrays from ``player_ids`` (ranking order) and rows of
+        (id, date_of_birth, nationality_id, team_id, season_id, position_id, shirt_number, is_captain, league_id).
+        """
+        player_ids = np.asarray(player_ids, dtype=np.int64)
+        player_index = {pid: index for index, pid in enumerate(player_ids.tolist())}
+
+        n_players = len(player_ids)
+        nationality = np.zeros(n_players, dtype=np.int64)
+        birth_year = np.zeros(n_players, dtype=np.int64)
+        has_birth_year = np.zeros(n_players, dtype=bool)
+        seen = np.zeros(n_players, dtype=bool)
+
+        row_player, team, season, league, position, shirt, captain = [], [], [], [], [], [], []
+        for pid, dob, nat_id, team_id, season_id, position_id, shirt_number, is_captain, league_id in rows:
+            index = player_index.get(pid)
+            if index is None:
+                continue
+
+            row_player.append(index)
+            team.append(team_id)
+            season.append(season_id)
+            league.append(league_id)
+            position.append(-1 if position_id is None else position_id)
+            shirt.append(-1 if shirt_number is None else shirt_number)
+            captain.append(bool(is_captain))
+
+            if not seen[index]:
+                # Player level values are taken from the player's first row
+                seen[index] = True
+                nationality[index] = nat_id or 0
+                try:
+                    birth_year[index] = int(str(dob)[:4])
+                    has_birth_year[index] = True
+                except Exception:
+                    pass
+
+        return cls(player_ids=player_ids,
+                   row_player=np.asarray(row_player, dtype=np.int64),
+                   team=np.asarray(team, dtype=np.int64),
+                   season=np.asarray(season, dtype=np.int64),
+                   league=np.asarray(league, dtype=np.int64),
+                   position=np.asarray(position, dtype=np.int64),
+                   shirt=np.asarray(shirt, dtype=np.int64),
+                   captain=np.asarray(captain, dtype=bool),
+                   nationality=nationality,
+                   birth_year=birth_year,
+                   has_birth_year=has_birth_year)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, path):
+        """Load a saved index, memory-mapping the arrays read-only so processes share the same pages."""
+        return cls(**{name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in cls.ARRAYS})
+
+    def for_leagues(self, leagues_id):
+        """
+        Restrict the profiles to rows of the given leagues, dropping players without such rows. Players keep the
+        order of their first remaining row.
+        """
+        rows = np.isin(self.league, np.asarray(leagues_id, dtype=np.int64))
+        players, first_row = np.unique(self.row_player[rows], return_index=True)
+        players = players[np.argsort(first_row)]
+
+        remap = np.full(len(self), -1, dtype=np.int64)
+        remap[players] = np.arange(len(players))
+
+        return PlayerFeatures(player_ids=self.player_ids[players],
+                              row_player=remap[self.row_player[rows]],
+                              team=self.team[rows],
+                              season=self.season[rows],
+                              league=self.league[rows],
+                              position=self.position[rows],
+                              shirt=self.shirt[rows],
+                              captain=self.captain[rows],
+                              nationality=self.nationality[players],
+                              birth_year=self.birth_year[players],
+                              has_birth_year=self.has_birth_year[players])
+
+    def __len__(self):
+        return len(self.player_ids)
+
+
+def _shared_any(features, name, values, target_rows):
+    """Per player: does any of the player's rows share ``values`` with the target's rows."""
+    shared = np.zeros(len(features), dtype=bool)
+    shared[features.row_player[features.postings[name].lookup(values[target_rows])]] = True
+    return shared
+
+
+def _shared_team_seasons(features, target_rows):
+    """Per player: number of distinct (team, season) pairs shared with the target."""
+    pairs = features.team_season
+    rows = features.postings["team_season"].lookup(pairs[target_rows])
+
+    # Count each (player, team, season) once, like the set intersection it replaces
+    shared = np.unique(np.stack([features.row_player[rows], pairs[rows]]), axis=1)
+    return np.bincount(shared[0], minlength=len(features))
+
+
+def score_players(features, target_index):
+    """
+    Similarity of every player to the player at ``target_index``, matching the legacy ``score_profiles``.
+
+    Row level features only touch the posting lists of the target's own values, so the work grows with the overlap
+    rather than the roster. Players sharing none of them get their score from per-player arrays in bulk.
+    """
+    n_players = len(features)
+    target_rows = features.postings["player"].lookup([target_index])
+
+    shared_team_seasons = _shared_team_seasons(features, target_rows)
+    shared_teams = _shared_any(features, "team", features.team, target_rows)
+    shared_leagues = _shared_any(features, "league", features.league, target_rows)
+    shared_positions = _shared_any(features, "position", features.position, target_rows)
+    shared_shirts = _shared_any(features, "shirt", features.shirt, target_rows)
+
+    captains = features.captains
+
+    target_nationality = features.nationality[target_index]
+    same_nationality = (features.nationality != 0) & (features.nationality == target_nationality) \
+        if target_nationality else np.zeros(n_players, dtype=bool)
+
+    close_birth_year = features.has_birth_year & (np.abs(features.birth_year - features.birth_year[target_index]) <= 2) \
+        if features.has_birth_year[target_index] else np.zeros(n_players, dtype=bool)
+
+    # Keep the legacy summation order so float results (and ties) are bit-identical
+    score = 0.15 * shared_team_seasons
+    score = score + np.where(shared_teams & (shared_team_seasons == 0), 0.05, 0.0)
+    score = score + np.where(shared_leagues, 0.15, 0.0)
+    score = score + np.where(shared_positions, 0.10, 0.0)
+    score = score + np.where(same_nationality, 0.07, 0.0)
+    score = score + np.where(captains & captains[target_index], 0.03, 0.0)
+    score = score + np.where(shared_shirts, 0.02, 0.0)
+    score = score + np.where(close_birth_year, 0.03, 0.0)
+
+    # Only a handful of distinct scores exist, round them with Python's round() as the legacy code did
+    unique_scores, inverse = np.unique(score, return_inverse=True)
+    return np.asarray([round(float(value), 6) for value in unique_scores])[inverse]
+
+
+def rank_players(features, target_player_id):
+    """
+    Rank every player by similarity to ``target_player_id``.
+
+    The target gets rank 1, everybody else is ordered by descending score with ties kept in ``player_ids`` order.
+    """
+    target_index = features.player_index[target_player_id]
+
+    scores = score_players(features, target_index)
+    candidates = np.delete(np.arange(len(features)), target_index)
+    ordered = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    ranked_ids = [target_player_id] + features.player_ids[ordered].tolist()
+    return [{"id": pid, "rank": rank} for rank, pid in enumerate(ranked_ids, start=1)]
@@ -1,20 +1,151 @@
+import json
+import queue
+import re
+import threading
 import requests
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
+from requests.adapters import HTTPAdapter
+
+from common import FEATURE_INDEX_DIR, SPORTMONKS_WORKERS, SPORTMONKS_REQUESTS_PER_SECOND, SPORTMONKS_BURST, \
+    SPORTMONKS_CACHE_FILE, SPORTMONKS_CACHE_TTL
 from game.db import FootballDBHandler
+from game.feature_index import FeatureIndex
+from sportmonks.cache import ResponseCache
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by all fetcher threads.
+
+    Refills at ``rate`` tokens per second up to ``capacity``. The API reports how many calls are left in the current
+    window; ``throttle`` never lets the bucket hold more than that and waits for the reset once it runs out. ``pause``
+    stops all requests after a 429.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def throttle(self, remaining: int, resets_in: float):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = min(self.tokens, remaining)
+            if remaining <= 0:
+                self.paused_until = max(self.paused_until, now + resets_in)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
 
 
 class SportMonksAPIClient:
-    def __init__(self, base_url="https://api.sportmonks.com/v3/football/"):
+    MAX_RETRIES = 5
+
+    def __init__(self, base_url="https://api.sportmonks.com/v3/football/", workers: int = SPORTMONKS_WORKERS,
+                 cache_path: Optional[str] = SPORTMONKS_CACHE_FILE, offline: bool = False):
         self.api_token = ""
         self.base_url = base_url
+        self.workers = workers
 
-    def _get(self, endpoint, params=None):
-        if params is None:
-            params = {}
+        # Offline runs answer only from the response cache, expired entries included
+        self.cache = ResponseCache(cache_path) if cache_path else None
+        self.offline = offline
+        self.finished_seasons = set()
+
+        # Keep-alive connections, enough for every fetcher thread
+        self.session = requests.Session()
+        self.session.mount(base_url, HTTPAdapter(pool_connections=1, pool_maxsize=workers))
+        self.limiter = TokenBucket(SPORTMONKS_REQUESTS_PER_SECOND, SPORTMONKS_BURST)
+
+    def _request(self, url, params):
+        for attempt in range(self.MAX_RETRIES):
+            self.limiter.acquire()
+            response = self.session.get(url, params=params)
+
+            if response.status_code != 429:
+                return response
+
+            try:
+                retry_after = float(response.headers.get("Retry-After"))
+            except (TypeError, ValueError):
+                retry_after = 2 ** attempt
+            print(f"Rate limited, retrying in {retry_after:.0f}s")
+            self.limiter.pause(retry_after)
+
+        return response
+
+    def _ttl(self, endpoint):
+        # Data of a finished season never changes
+        season = re.search(r"seasons/(\d+)", endpoint)
+        if season and int(season.group(1)) in self.finished_seasons:
+            return None
+
+        for prefix, ttl in SPORTMONKS_CACHE_TTL.items():
+            if endpoint.startswith(prefix):
+                return ttl
+
+        return SPORTMONKS_CACHE_TTL[""]
+
+    def _fetch_page(self, endpoint, params):
+        if self.cache:
+            body = self.cache.get(endpoint, params, ignore_expiry=self.offline)
+            if body is not None:
+                return json.loads(body)
+
+        if self.offline:
+            raise LookupError(f"Offline: {endpoint} page {params['page']} is not cached")
+
+        response = self._request(self.base_url + endpoint, params)
+
+        # A missing page would read as the end of the data, and the import would drop links that still exist
+        if response.status_code != 200:
+            raise requests.HTTPError(f"{endpoint} page {params['page']}: {response.status_code} - {response.text}",
+                                     response=response)
+
+        json_data = response.json()
+
+        rate_limit = json_data.get('rate_limit')
+        if rate_limit:
+            self.limiter.throttle(rate_limit['remaining'], rate_limit['resets_in_seconds'])
+
+        if self.cache:
+            self.cache.set(endpoint, params, response.content, self._ttl(endpoint))
+
+        return json_data
+
+    def _iter_pages(self, endpoint, params=None):
+        """
+        Yield the data of each page as it arrives, so only one page is held at a time. Single object endpoints yield
+        the object once. Raises when a page can't be fetched, so a result is never silently partial.
+        """
+        params = dict(params or {})
         params['api_token'] = self.api_token
 
-        all_data = []
         is_specific_page = params.get('page', None) is not None
         page = int(params.get('page', 1))
         per_page = 25  # todo: change to 50?
@@ -23,30 +154,27 @@ class SportMonksAPIClient:
             params['page'] = page
             params['per_page'] = per_page
 
-            url = self.base_url + endpoint
-            response = requests.get(url, params=params)
-
-            if response.status_code != 200:
-                print(f"Error: {response.status_code} - {response.text}")
-                break
-
-            json_data = response.json()
+            json_data = self._fetch_page(endpoint, params)
             data = json_data.get('data', [])
             pagination = json_data.get('pagination', {})
 
             if not data:
-                break
+                return
 
-            if isinstance(data, list):
-                all_data.extend(data)
-            else:
-                all_data = data
+            yield data
 
             if not pagination.get('has_more', False) or is_specific_page:
-                break
+                return
 
             page += 1
-            time.sleep(2)
+
+    def _get(self, endpoint, params=None):
+        all_data = []
+        for data in self._iter_pages(endpoint, params):
+            if isinstance(data, list):
+                all_data.extend(data)
+            else:
+                all_data = data
 
         return all_data
 
@@ -56,7 +184,12 @@ class SportMonksAPIClient:
 
     def get_seasons_by_league(self, league_id):
         """Returns all seasons available for a given league using the leagues endpoint."""
-        return self._get(f"leagues/{league_id}", {"include": "seasons"})
+        league = self._get(f"leagues/{league_id}", {"include": "seasons"})
+
+        # Responses of finished seasons are cached for good
+        self.finished_seasons.update(season['id'] for season in (league or {}).get('seasons', [])
+                                     if season.get('finished'))
+        return league
 
     def get_teams_by_season(self, season_id):
         """Returns all teams that participated in a specific season"""
@@ -64,19 +197,87 @@ class SportMonksAPIClient:
 
     def get_players_by_season_team(self, season_id, team_id):
         """Returns players in a specific team"""
-        return self._get(f"squads/seasons/{season_id}/teams/{team_id}", {
+        return self._get(*self._squad_request(season_id, team_id))
+
+    @staticmethod
+    def _squad_request(season_id, team_id):
+        return f"squads/seasons/{season_id}/teams/{team_id}", {
             "include": "player;player.nationality;position;details.type",
             "filters": "playerstatisticdetailTypes:40"
-        })
+        }
+
+    def iter_players_by_season_teams(self, season_id, team_ids):
+        """
+        Yields the squads of several teams of a season in ``team_ids`` order, each as an iterator over its pages.
+
+        Squads are fetched in parallel, at most ``workers`` of them ahead of the consumer, and each fetcher waits
+        until the consumer took its previous page. Memory stays at a few pages whatever the size of the season.
+        Whatever is left of a squad when the consumer moves on to the next one is read and dropped. Close the
+        generator when not consuming it to the end, so the fetchers stop.
+        """
+        stop = threading.Event()
+
+        def put(pages, item):
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def fetch(team_id, pages):
+            try:
+                for page in self._iter_pages(*self._squad_request(season_id, team_id)):
+                    if not put(pages, page):
+                        return
+                put(pages, None)
+            except Exception as e:
+                put(pages, e)
+
+        def read(pages):
+            while (page := pages.get()) is not None:
+                if isinstance(page, Exception):
+                    stop.set()
+                    raise page
+                yield page
+
+        team_ids = iter(team_ids)
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sportmonks") as executor:
+            def submit():
+                for team_id in team_ids:
+                    pages = queue.Queue(maxsize=1)
+                    executor.submit(fetch, team_id, pages)
+                    in_flight.append(read(pages))
+                    return
+
+            try:
+                for _ in range(self.workers):
+                    submit()
+
+                while in_flight:
+                    squad = in_flight.popleft()
+                    yield squad
+                    for _ in squad:
+                        pass
+                    submit()
+            finally:
+                stop.set()
 
     def get_players(self):
-        return self._get(f"players", {
+        return list(self.iter_players())
+
+    def iter_players(self):
+        """Streams the players of ``get_players`` page by page"""
+        for page in self._iter_pages(f"players", {
             "page": "1",
             "include": "nationality;country;position;teams;transfers;statistics;"
                        "transfers.toteam;transfers.toteam.country;transfers.fromteam;transfers.fromteam.country;"
                        "teams.team",
             "filters": "playerCountries:802",
-        })
+        }):
+            yield from page
 
     def get_player_by_id(self, player_id):
         # 123742 - eran
@@ -85,14 +286,17 @@ class SportMonksAPIClient:
         })
 
 
-def get_api_data():
-    api_client = SportMonksAPIClient()
+def get_api_data(full: bool = False, offline: bool = False):
+    api_client = SportMonksAPIClient(offline=offline)
 
     db_handler = FootballDBHandler()
-    db_handler.populate_database(api_client, 372)  # ליגת העל
-    db_handler.populate_database(api_client, 375)  # ליגה לאומית
-    db_handler.populate_database(api_client, 564)  # La Liga
-    db_handler.populate_database(api_client, 8)  # Premier League
-    db_handler.populate_database(api_client, 82)  # Bundesliga
-    db_handler.populate_database(api_client, 301)  # Ligue 1
-    db_handler.populate_database(api_client, 384)  # Serie A
+    db_handler.populate_database(api_client, 372, full=full)  # ליגת העל
+    db_handler.populate_database(api_client, 375, full=full)  # ליגה לאומית
+    db_handler.populate_database(api_client, 564, full=full)  # La Liga
+    db_handler.populate_database(api_client, 8, full=full)  # Premier League
+    db_handler.populate_database(api_client, 82, full=full)  # Bundesliga
+    db_handler.populate_database(api_client, 301, full=full)  # Ligue 1
+    db_handler.populate_database(api_client, 384, full=full)  # Serie A
+
+    # Build the player feature index once, so game creation doesn't have to
+    FeatureIndex(db_handler, FEATURE_INDEX_DIR).build()
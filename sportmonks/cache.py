@@ -0,0 +1,57 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Optional
+
+
+class ResponseCache:
+    """
+    SportMonks response bodies, zlib-compressed in a SQLite file.
+
+    Entries are content addressed by a hash of the endpoint and its query parameters (without the api token), and
+    expire after a per-endpoint TTL; a TTL of None keeps them forever.
+    """
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS Responses (
+                key         TEXT PRIMARY KEY,
+                endpoint    TEXT NOT NULL,
+                body        BLOB NOT NULL,
+                fetched_at  REAL NOT NULL,
+                expires_at  REAL
+            )
+        ''')
+        self.hits = self.misses = 0
+        # Shared by the fetcher threads
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(endpoint: str, params) -> str:
+        params = sorted((name, str(value)) for name, value in params.items() if name != "api_token")
+        return hashlib.sha256(json.dumps([endpoint, params]).encode("utf-8")).hexdigest()
+
+    def get(self, endpoint: str, params, ignore_expiry: bool = False) -> Optional[bytes]:
+        with self._lock:
+            row = self.conn.execute("SELECT body, expires_at FROM Responses WHERE key = ?",
+                                    (self.key(endpoint, params),)).fetchone()
+
+            if row is None or (not ignore_expiry and row[1] is not None and row[1] <= time.time()):
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return zlib.decompress(row[0])
+
+    def set(self, endpoint: str, params, body: bytes, ttl: Optional[float]):
+        now = time.time()
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO Responses (key, endpoint, body, fetched_at, expires_at) "
+                              "VALUES (?, ?, ?, ?, ?)",
+                              (self.key(endpoint, params), endpoint, zlib.compress(body, 6), now,
+                               None if ttl is None else now + ttl))
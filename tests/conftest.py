@@ -0,0 +1,16 @@
+import pytest
+
+from game.db import FootballDBHandler
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A FootballDBHandler on a fresh SQLite database in tmp_path."""
+    # The file is DB_FILE_NAME in the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(FootballDBHandler, "_instance", None)
+    monkeypatch.setattr(FootballDBHandler, "_initialized", False)
+
+    handler = FootballDBHandler("sqlite")
+    yield handler
+    handler.close()
@@ -0,0 +1,56 @@
+"""
+Jobs left queued or running by a worker that stopped are reported as failed instead of in progress forever.
+"""
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from game.jobs import JobQueue
+
+
+def _leave_behind(db, status: str, heartbeat_age: timedelta) -> int:
+    """A job owned by a worker that is gone, last heartbeated ``heartbeat_age`` ago."""
+    job_id = db.create_job("create_game", {}, "gone-host:1")
+    db.update_job(job_id, status)
+    with db.connection() as conn:
+        conn.cursor().execute("UPDATE Jobs SET heartbeat_at = ? WHERE id = ?", (datetime.utcnow() - heartbeat_age, job_id))
+        conn.commit()
+
+    return job_id
+
+
+@pytest.mark.parametrize("status", ["queued", "running"])
+def test_job_of_a_dead_worker_is_reported_failed(db, status):
+    job_id = _leave_behind(db, status, timedelta(minutes=5))
+
+    job = JobQueue(db, 1).get(job_id)
+
+    assert job["status"] == "failed"
+    assert job["error"] == "worker restarted"
+
+
+def test_startup_fails_stale_jobs(db):
+    job_id = _leave_behind(db, "running", timedelta(minutes=5))
+
+    JobQueue(db, 1)
+
+    assert db.get_job(job_id)["status"] == "failed"
+
+
+def test_live_jobs_stay_in_progress(db):
+    recent = _leave_behind(db, "running", timedelta(seconds=5))
+    assert JobQueue(db, 1).get(recent)["status"] == "running"
+
+    queue = JobQueue(db, 1, heartbeat=timedelta(milliseconds=50), stale_after=timedelta(milliseconds=300))
+    release = threading.Event()
+    own = queue.submit("create_game", {}, lambda: release.wait(5))
+    try:
+        # Longer than stale_after: only the heartbeats keep the job alive
+        threading.Event().wait(0.6)
+        assert queue.get(own)["status"] == "running"
+    finally:
+        release.set()
+        queue.executor.shutdown()
+
+    assert db.get_job(own)["status"] == "done"
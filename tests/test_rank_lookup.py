@@ -0,0 +1,58 @@
+"""
+Rank checks of a cold game use point queries, the whole ranking is loaded once the game gets enough checks.
+"""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from game.cache import GameCacheService
+
+PLAYERS = range(1000, 1050)
+
+
+@pytest.fixture
+def service(db, monkeypatch):
+    ranking = [{"id": player_id, "rank": rank} for rank, player_id in enumerate(reversed(PLAYERS), 1)]
+    # Games are numbered when scheduled: schedule two, then activate the first
+    players = json.dumps([{"id": player_id, "name": str(player_id)} for player_id in PLAYERS])
+    for days in (1, 2):
+        db.create_game((datetime.utcnow() + timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S"), ranking, "hint", [8],
+                       players)
+    with db.connection() as conn:
+        conn.cursor().execute("UPDATE Games SET activate_at = ? WHERE game_number = 1",
+                              ((datetime.utcnow() - timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S"),))
+        conn.commit()
+
+    calls = {"get_player_rank": 0, "get_game_ranking": 0}
+    for name in calls:
+        def counted(*args, method=getattr(db, name), name=name):
+            calls[name] += 1
+            return method(*args)
+        monkeypatch.setattr(db, name, counted)
+
+    service = GameCacheService(db, backend="memory", rank_index_min_lookups=3)
+    service.calls = calls
+    return service
+
+
+def test_cold_game_uses_point_queries(service):
+    assert [service.get_rank(1, player_id) for player_id in (1049, 1000, 1020)] == [1, 50, 30]
+    assert service.calls == {"get_player_rank": 3, "get_game_ranking": 0}
+
+    # Cached
+    assert service.get_rank(1, 1049) == 1
+    assert service.calls["get_player_rank"] == 3
+
+
+def test_hot_game_loads_the_ranking_once(service):
+    ranks = [service.get_rank(1, player_id) for player_id in PLAYERS]
+
+    assert ranks == list(range(50, 0, -1))
+    assert service.calls == {"get_player_rank": 3, "get_game_ranking": 1}
+    assert service.get_rank(1, 1) is None
+
+
+def test_inactive_game_answers_none_uncached(service):
+    assert service.get_rank(2, 1049) is None
+    assert (2, 1049) not in service.rank_cache.entries
@@ -0,0 +1,216 @@
+"""
+Parity of the vectorised ranking (game.similarity) with the legacy pandas implementation it replaced.
+
+The legacy ``calculate_all_distances_fixed`` is kept below verbatim, apart from taking the database path, and used as
+the oracle on a generated SQLite roster with the baseline schema.
+"""
+import random
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from game.similarity import PlayerFeatures, rank_players
+
+LEAGUE_SETS = [[8], [82], [8, 82], [301, 372, 375], [8, 82, 301, 372, 375]]
+
+
+def legacy_calculate_all_distances_fixed(db_path, target_player_id, leagues_id=None):
+    def score_profiles(profile1, profile2):
+        score = 0.0
+
+        team_season_1 = set(zip(profile1["team_id"], profile1["season_id"]))
+        team_season_2 = set(zip(profile2["team_id"], profile2["season_id"]))
+        shared_team_seasons = team_season_1 & team_season_2
+        score += 0.15 * len(shared_team_seasons)
+
+        teams1 = set(profile1["team_id"])
+        teams2 = set(profile2["team_id"])
+        shared_teams = teams1 & teams2
+        if shared_teams and not shared_team_seasons:
+            score += 0.05
+
+        league1 = set(profile1["league_id"])
+        league2 = set(profile2["league_id"])
+        shared_league = league1 & league2
+        if shared_league:
+            score += 0.15
+
+        positions1 = set(profile1["position_id"])
+        positions2 = set(profile2["position_id"])
+        if positions1 & positions2:
+            score += 0.10
+
+        nat1 = profile1["nationality_id"].iloc[0] if not profile1.empty else None
+        nat2 = profile2["nationality_id"].iloc[0] if not profile2.empty else None
+        if nat1 and nat2 and nat1 == nat2:
+            score += 0.07
+
+        if profile1["is_captain"].any() and profile2["is_captain"].any():
+            score += 0.03
+
+        shirts1 = set(profile1["shirt_number"].dropna())
+        shirts2 = set(profile2["shirt_number"].dropna())
+        if shirts1 & shirts2:
+            score += 0.02
+
+        try:
+            yob1 = int(profile1["date_of_birth"].iloc[0][:4])
+            yob2 = int(profile2["date_of_birth"].iloc[0][:4])
+            if abs(yob1 - yob2) <= 2:
+                score += 0.03
+        except Exception:
+            pass
+
+        return round(score, 6)
+
+    conn = sqlite3.connect(db_path)
+
+    # Get all player IDs
+    first_query = """
+        SELECT DISTINCT(P.id) 
+        FROM Players P
+    """
+    if leagues_id is not None and len(leagues_id) > 0:
+        placeholders = ",".join(["?"] * len(leagues_id))
+        first_query += f" INNER JOIN PlayerTeamSeason PS ON PS.PLAYER_ID = P.ID INNER JOIN Seasons S on S.id = PS.season_id " \
+                       f"AND S.league_id IN ({placeholders}) "
+    all_players_df = pd.read_sql_query(first_query, conn, params=leagues_id)
+
+    all_player_ids = all_players_df["id"].tolist()
+
+    query = f"""
+        SELECT DISTINCT(P.id), P.date_of_birth, P.nationality_id, PS.team_id, PS.season_id,
+               PS.position_id, PS.shirt_number, PS.is_captain, S.league_id
+        FROM Players P
+        JOIN PlayerTeamSeason PS ON P.id = PS.player_id
+    """
+    if leagues_id is not None and len(leagues_id) > 0:
+        placeholders = ",".join(["?"] * len(leagues_id))
+        query += f" INNER JOIN Seasons S on S.id = PS.season_id AND S.league_id IN ({placeholders}) "
+
+    placeholders = ",".join(["?"] * len(all_player_ids))
+    query += f"WHERE P.id IN ({placeholders})"
+
+    df = pd.read_sql_query(query, conn, params=leagues_id + all_player_ids)
+
+    # Optional: split into dictionary by player ID (if needed)
+    profiles = {pid: df[df["id"] == pid] for pid in all_player_ids}
+
+    target_profile = profiles[target_player_id]
+    similarity_scores = {}
+
+    for pid in all_player_ids:
+        if pid == target_player_id:
+            continue  # exclude for now, we'll insert it as rank 1 later
+        similarity_scores[pid] = score_profiles(target_profile, profiles[pid])
+
+    # Sort by descending score
+    sorted_scores = sorted(similarity_scores.items(), key=lambda x: -x[1])
+
+    # Assign unique ranks, starting from 2
+    distance_map = {
+        target_player_id: {
+            "id": target_player_id,
+            "rank": 1
+        }
+    }
+    for rank, (pid, _) in enumerate(sorted_scores, start=2):
+        distance_map[pid] = {
+            "id": pid,
+            "rank": rank
+        }
+
+    conn.close()
+    return list(distance_map.values())
+
+
+def _create_roster(path, seed=7):
+    """
+    A roster with the edge cases of the real data: missing / unparsable birth dates, missing nationality, position
+    and shirt number, captains, players moving between teams and leagues, and duplicated links.
+    """
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE Players (id INTEGER PRIMARY KEY, date_of_birth TEXT, nationality_id INTEGER);
+        CREATE TABLE Seasons (id INTEGER PRIMARY KEY, league_id INTEGER NOT NULL, name TEXT);
+        CREATE TABLE PlayerTeamSeason (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            player_id INTEGER NOT NULL,
+            team_id INTEGER NOT NULL,
+            season_id INTEGER NOT NULL,
+            position_id INTEGER,
+            shirt_number INTEGER,
+            is_captain BOOLEAN
+        );
+    """)
+
+    leagues = sorted({league for leagues_id in LEAGUE_SETS for league in leagues_id})
+    seasons = [(league * 10 + year, league, f"20{year}") for league in leagues for year in range(3)]
+    teams = {league: [league * 100 + team for team in range(6)] for league in leagues}
+
+    players = []
+    for player_id in range(1000, 1300):
+        date_of_birth = rnd.choice([None, "bad", f"{rnd.randint(1985, 2002)}-0{rnd.randint(1, 9)}-1{rnd.randint(0, 9)}"])
+        players.append((player_id, date_of_birth, rnd.choice([None, 0, 1, 2, 3, 4])))
+
+    links = []
+    for player_id, _, _ in players:
+        for _ in range(rnd.randint(1, 4)):
+            season_id, league, _ = rnd.choice(seasons)
+            link = (player_id, rnd.choice(teams[league]), season_id, rnd.choice([None, 24, 25, 26, 27]),
+                    rnd.choice([None, 1, 7, 9, 10, 99]), rnd.random() < 0.05)
+            links.append(link)
+            if rnd.random() < 0.1:
+                links.append(link)
+    rnd.shuffle(links)
+
+    conn.executemany("INSERT INTO Players VALUES (?, ?, ?)", players)
+    conn.executemany("INSERT INTO Seasons VALUES (?, ?, ?)", seasons)
+    conn.executemany("INSERT INTO PlayerTeamSeason (player_id, team_id, season_id, position_id, shirt_number, is_captain) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", links)
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture(scope="module")
+def roster(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("roster") / "football_data.db")
+    _create_roster(path)
+
+    # The rows FootballDBHandler.get_player_features reads, players in the order FeatureIndex.build uses
+    conn = sqlite3.connect(path)
+    rows = conn.execute("""
+        SELECT P.id, P.date_of_birth, P.nationality_id, PS.team_id, PS.season_id,
+               PS.position_id, PS.shirt_number, PS.is_captain, S.league_id
+        FROM Players P
+        INNER JOIN PlayerTeamSeason PS ON PS.player_id = P.id
+        INNER JOIN Seasons S ON S.id = PS.season_id
+        ORDER BY PS.id
+    """).fetchall()
+    conn.close()
+
+    features = PlayerFeatures.from_rows(list(dict.fromkeys(row[0] for row in rows)), rows)
+    return path, features
+
+
+@pytest.mark.parametrize("leagues_id", LEAGUE_SETS)
+def test_ranks_match_legacy(roster, leagues_id):
+    path, features = roster
+    league_features = features.for_leagues(leagues_id)
+
+    targets = random.Random(sum(leagues_id)).sample(league_features.player_ids.tolist(), 12)
+    for target in targets:
+        assert rank_players(league_features, target) == legacy_calculate_all_distances_fixed(path, target, leagues_id)
+
+
+def test_saved_index_ranks_match(roster, tmp_path):
+    path, features = roster
+    features.save(str(tmp_path / "index"))
+    loaded = PlayerFeatures.load(str(tmp_path / "index")).for_leagues([8, 82])
+
+    target = int(loaded.player_ids[0])
+    assert rank_players(loaded, target) == legacy_calculate_all_distances_fixed(path, target, [8, 82])
+    assert np.array_equal(loaded.player_ids, features.for_leagues([8, 82]).player_ids)
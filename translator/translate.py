@@ -1,35 +1,72 @@
+import json
+import random
 import time
+import unicodedata
 import openai
 import re
 import math
 
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from game.db import FootballDBHandler
 
 OPEN_API_KEY = ''
 
+BATCH_SIZE = 20  # names per prompt
+WORKERS = 4  # concurrent requests
+RETRIES = 4
+COMMIT_ROWS = 200
+
+
+class TranslationBackend(ABC):
+    """
+    Translates player names to Hebrew in batches.
+
+    ``translate`` gets dicts with first_name, last_name, team_name and shirt_number and returns one Hebrew full name
+    per player, in the same order. It may raise; the pipeline retries the batch.
+    """
+
+    @abstractmethod
+    def translate(self, players):
+        ...
+
 
-def translate_full_name_via_gpt(first_name, last_name, team_name="", shirt_number=""):
-    full_name = f"{first_name} {last_name}".strip()
-    context = f"He plays for {team_name}" if team_name else ""
-    if shirt_number:
-        context += f" and wears jersey number {shirt_number}"
+class OpenAIBackend(TranslationBackend):
+    def __init__(self, api_key: str = OPEN_API_KEY, model: str = "gpt-4"):
+        # One client (and its connection pool) for every request and thread
+        self.client = openai.OpenAI(api_key=api_key)
+        self.model = model
 
-    prompt = (
-        f"Translate the football player's name '{full_name}' to Hebrew. {context}. "
-        f"Use common Israeli sports media conventions."
-    )
+    @staticmethod
+    def _describe(player):
+        full_name = f"{player['first_name']} {player['last_name']}".strip()
+        context = f"plays for {player['team_name']}" if player.get('team_name') else ""
+        if player.get('shirt_number'):
+            context += f", jersey number {player['shirt_number']}"
 
-    try:
-        client = openai.OpenAI(api_key=OPEN_API_KEY)
-        response = client.chat.completions.create(
-            model="gpt-4",
+        return f"{full_name} ({context})" if context else full_name
+
+    def translate(self, players):
+        names = "\n".join(f"{index}. {self._describe(player)}" for index, player in enumerate(players, start=1))
+        prompt = (
+            "Translate these football players' names to Hebrew. Use common Israeli sports media conventions.\n"
+            "Answer with a JSON array of the Hebrew full names only, one per player, in the same order.\n\n"
+            f"{names}"
+        )
+
+        response = self.client.chat.completions.create(
+            model=self.model,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.2
         )
-        return response.choices[0].message.content.strip().replace('"', "")
-    except Exception as e:
-        print(f"❌ Error translating '{full_name}': {e}")
-        return ""
+        content = response.choices[0].message.content
+        translated = json.loads(content[content.index("["):content.rindex("]") + 1])
+
+        if len(translated) != len(players):
+            raise ValueError(f"Expected {len(players)} names, got {len(translated)}")
+
+        return [str(name).strip().replace('"', "") for name in translated]
 
 
 def create_display_name_he(display_name, first_name_he, last_name_he):
@@ -45,32 +82,172 @@ def create_display_name_he(display_name, first_name_he, last_name_he):
     return f"{first_name_he} {last_name_he}"
 
 
-def translate_db():
-    db_handler = FootballDBHandler()
-    df = db_handler.get_players_for_translate()
-
-    print("🔁 Translating rows...")
-    for index, row in df.iterrows():
-        player_id = row.get("id", "")
-        first = row.get("first_name", "")
-        last = row.get("last_name", "")
-        display = row.get("display_name", "")
-        team = row.get("team_name", "")
+def split_full_name_he(full_he):
+    if " " in full_he:
+        first_he, last_he = full_he.split(" ", 1)
+        return first_he, last_he
+
+    return full_he, ""
+
+
+class TranslationMemo:
+    """
+    Hebrew translations reused across runs: whole names and single name tokens, keyed by normalised source.
+
+    A name is answered from the memo when the full name is known, or composed when every one of its tokens is.
+    Backend results teach the memo the full name, and the tokens too when the Hebrew has one word per token.
+    """
+
+    def __init__(self, db_handler):
+        self.db = db_handler
+        memo = db_handler.get_translation_memo()
+        self.full = memo["full"]
+        self.tokens = memo["token"]
+        self.new = []
+
+        for player in db_handler.get_translated_players():
+            self.learn(player, f"{player['first_name_he'] or ''} {player['last_name_he'] or ''}".strip())
+
+    @staticmethod
+    def normalise(text):
+        # Accents and case don't change the Hebrew spelling
+        text = unicodedata.normalize("NFKD", text or "")
+        text = "".join(char for char in text if not unicodedata.combining(char))
+        return " ".join(text.lower().split())
+
+    @classmethod
+    def _source(cls, player):
+        first = cls.normalise(player["first_name"]).split()
+        last = cls.normalise(player["last_name"]).split()
+        return first, last
+
+    @classmethod
+    def key(cls, player):
+        first, last = cls._source(player)
+        return " ".join(first + last)
+
+    def lookup(self, player):
+        """(first_he, last_he) from the memo, or None."""
+        first, last = self._source(player)
+        full_he = self.full.get(" ".join(first + last))
+        if full_he:
+            return split_full_name_he(full_he)
+
+        if (first or last) and all(token in self.tokens for token in first + last):
+            return " ".join(self.tokens[token] for token in first), " ".join(self.tokens[token] for token in last)
+
+        return None
+
+    def _add(self, kind, source, hebrew, known):
+        if source and hebrew and source not in known:
+            known[source] = hebrew
+            self.new.append((kind, source, hebrew))
+
+    def learn(self, player, full_he):
+        first, last = self._source(player)
+        self._add("full", " ".join(first + last), full_he, self.full)
+
+        words = full_he.split()
+        if len(words) == len(first + last):
+            for token, word in zip(first + last, words):
+                self._add("token", token, word, self.tokens)
+
+    def flush(self):
+        if self.new:
+            self.db.save_translation_memo(self.new)
+            self.new = []
+
+
+def _translate_batch(backend, batch):
+    """Translate a batch, retrying with exponential backoff and jitter. Returns None if every attempt failed."""
+    for attempt in range(RETRIES):
+        try:
+            return backend.translate(batch)
+        except Exception as e:
+            delay = 2 ** attempt + random.random()
+            print(f"❌ Error translating batch of {len(batch)} (attempt {attempt + 1}/{RETRIES}): {e}")
+            if attempt + 1 < RETRIES:
+                time.sleep(delay)
+
+    return None
+
+
+def _players_to_translate(db_handler):
+    players = []
+    for row in db_handler.get_players_for_translate().to_dict(orient="records"):
         shirt = row.get("shirt_number", "")
-        if isinstance(shirt, float) and math.isnan(shirt):
+        if shirt is None or (isinstance(shirt, float) and math.isnan(shirt)):
             shirt = ''
+        elif isinstance(shirt, float):
+            shirt = int(shirt)
+
+        players.append({**row, "shirt_number": shirt})
+
+    return players
 
-        full_he = translate_full_name_via_gpt(first, last, team, shirt)
 
-        if " " in full_he:
-            parts = full_he.split(" ", 1)
-            first_he, last_he = parts[0], parts[1]
+def translate_db(backend: TranslationBackend = None):
+    """
+    Translate every player without a Hebrew name.
+
+    Names known to the translation memo are resolved locally. Each distinct unseen name goes to ``backend`` (OpenAI
+    by default) once, in batches from a few concurrent workers, and results are stored in batches. Only players
+    without a Hebrew name are selected, so an interrupted run resumes after the last stored batch and failed batches
+    are retried by the next run.
+    """
+    backend = backend or OpenAIBackend()
+    db_handler = FootballDBHandler()
+    memo = TranslationMemo(db_handler)
+
+    players = _players_to_translate(db_handler)
+    started = time.perf_counter()
+    pending, failed = [], 0
+
+    def _store(player, first_he, last_he):
+        display_he = create_display_name_he(player["display_name"], first_he, last_he)
+        pending.append((player["id"], first_he, last_he, display_he))
+        print(f"✅ {player['display_name']} → {display_he}/{first_he} {last_he}")
+
+    # Players sharing a normalised name are translated once
+    unseen = {}
+    for player in players:
+        known = memo.lookup(player)
+        if known:
+            _store(player, *known)
         else:
-            first_he, last_he = full_he, ""
+            unseen.setdefault(memo.key(player), []).append(player)
+
+    names = list(unseen.values())
+    batches = [names[i:i + BATCH_SIZE] for i in range(0, len(names), BATCH_SIZE)]
+    print(f"🔁 {len(players) - sum(map(len, names))} players from the memo, "
+          f"translating {len(names)} names in {len(batches)} batches...")
+
+    def _flush():
+        memo.flush()
+        if not pending:
+            return
+
+        db_handler.update_players_he(pending)
+        pending.clear()
+
+    with ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="translate") as executor:
+        futures = {executor.submit(_translate_batch, backend, [group[0] for group in batch]): batch
+                   for batch in batches}
+
+        for future in as_completed(futures):
+            batch, translated = futures[future], future.result()
+            if translated is None:
+                failed += sum(map(len, batch))
+                continue
+
+            for group, full_he in zip(batch, translated):
+                memo.learn(group[0], full_he)
+                for player in group:
+                    _store(player, *split_full_name_he(full_he))
 
-        display_he = create_display_name_he(display, first_he, last_he)
+            if len(pending) >= COMMIT_ROWS:
+                _flush()
 
-        db_handler.update_player(player_id, first_he, last_he, display_he)
+        _flush()
 
-        print(f"✅ {display} → {display_he}/{first_he} {last_he}")
-        time.sleep(.7)
+    print(f"Translated {len(players) - failed} players in {time.perf_counter() - started:.1f}s, {failed} failed")